@@ -0,0 +1,85 @@
+"""Frames per second of each quality mode for each output size.
+
+    python src/bench_resample.py [--zooms 2,2.5,4] [--seconds 1]
+
+Sizes cover the windowed lens, a docked strip and fullscreen at 1080p and 4K.
+Each frame scales a random BGRA capture into a reused buffer, as the capture
+thread does. "smooth" is the QPainter path the capture thread uses by default
+and "scaled" is QImage.scaled, which allocates a new image per frame; both are
+skipped when PySide6 is not installed.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from resample import MODES, Resampler
+
+try:
+    from PySide6.QtCore import QRectF, Qt
+    from PySide6.QtGui import QImage, QPainter
+except ImportError:
+    QImage = None
+
+SIZES = {
+    "windowed": (200, 200),
+    "docked": (1920, 200),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+class QtScaler:
+    """Qt's filtered scaling, with the interface of Resampler."""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def scale(self, src, out):
+        h, w = src.shape[:2]
+        dst_h, dst_w = out.shape[:2]
+        source = QImage(src.data, w, h, w * 4, QImage.Format_RGB32)
+        if self.mode == "scaled":
+            return source.scaled(dst_w, dst_h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        frame = QImage(out.data, dst_w, dst_h, dst_w * 4, QImage.Format_RGB32)
+        painter = QPainter(frame)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(QRectF(0, 0, dst_w, dst_h), source)
+        painter.end()
+        return out
+
+
+def fps(resampler, src, out, seconds):
+    resampler.scale(src, out)  # build the kernel outside the timing
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        resampler.scale(src, out)
+        frames += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return frames / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--zooms", default="2,2.5,4")
+    ap.add_argument("--sizes", default=",".join(SIZES))
+    ap.add_argument("--seconds", type=float, default=1.0, help="per measurement")
+    args = ap.parse_args()
+    rng = np.random.default_rng(0)
+    scalers = [(mode, Resampler) for mode in MODES]
+    if QImage is not None:
+        scalers = [("smooth", QtScaler), ("scaled", QtScaler)] + scalers
+    print(f"{'size':<10} {'zoom':>5} " + " ".join(f"{m:>10}" for m, _ in scalers) + "   (frames/s)")
+    for name in args.sizes.split(","):
+        width, height = SIZES[name]
+        out = np.empty((height, width, 4), np.uint8)
+        for zoom in (float(z) for z in args.zooms.split(",")):
+            src = rng.integers(0, 256, (int(height / zoom), int(width / zoom), 4), np.uint8)
+            rates = [fps(scaler(mode), src, out, args.seconds) for mode, scaler in scalers]
+            print(f"{name:<10} {zoom:>5.1f} " + " ".join(f"{r:>10.1f}" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
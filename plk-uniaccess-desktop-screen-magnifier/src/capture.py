@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+
+import mss
+import numpy as np
+from PySide6.QtCore import QRectF, QThread, Signal
+from PySide6.QtGui import QImage, QPainter
+
+from damage import damage_watcher, TileHash
+from resample import QUALITIES, Resampler
+
+
+class FrameStats:
+    """Frames actually painted per second and the process CPU time they cost."""
+
+    def __init__(self):
+        self.reset(time.perf_counter())
+
+    def reset(self, now):
+        self.started = now
+        self.cpu_started = time.process_time()
+        self.ticks = 0
+        self.frames = 0
+
+    def tick(self):
+        self.ticks += 1
+
+    def presented(self):
+        self.frames += 1
+
+    def summary(self, now, mode):
+        # process CPU covers the capture thread too
+        elapsed = max(now - self.started, 1e-9)
+        cpu = time.process_time() - self.cpu_started
+        return (f"{mode}: {self.frames / elapsed:.1f} fps ({self.ticks / elapsed:.1f} checks/s), "
+                f"cpu {cpu / max(self.frames, 1) * 1e3:.2f} ms/frame, "
+                f"{cpu / elapsed * 100:.1f}% of a core")
+
+
+class StageTimes:
+    """Recent durations of each pipeline stage: capture, scale, present."""
+
+    STAGES = ("capture", "scale", "present")
+
+    def __init__(self, keep=120):
+        self.samples = {stage: deque(maxlen=keep) for stage in self.STAGES}
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def last(self, stage):
+        samples = self.samples[stage]
+        return samples[-1] if samples else 0.0
+
+    def summary(self):
+        parts = []
+        for stage, samples in self.samples.items():
+            if samples:
+                mean = sum(samples) / len(samples)
+                parts.append(f"{stage} {mean * 1e3:.2f}/{max(samples) * 1e3:.2f} ms")
+        return "mean/max " + ", ".join(parts) if parts else "no frames"
+
+
+class CaptureWorker(QThread):
+    """Grabs and scales frames off the GUI thread.
+
+    The GUI submits the view it wants (capture region and output size) on every
+    timer tick; only the newest request is kept. Frames are scaled into two
+    reused buffers (arrays shared with QImages): the GUI shows one while the
+    worker fills the other. A finished frame is announced with frame_ready and
+    fetched with take(); until then the worker starts no new frame, so when the
+    GUI falls behind requests are dropped instead of queued.
+    """
+
+    frame_ready = Signal()
+
+    def __init__(self, quality="smooth", parent=None):
+        super().__init__(parent)
+        self.quality = "smooth"  # one of QUALITIES, read before every frame
+        self.set_quality(quality)
+        self.resampler = Resampler()
+        self.times = StageTimes()
+        self.dropped = 0  # requests replaced by a newer one before being served
+        self._cond = threading.Condition()
+        self._request = None
+        self._running = True
+        self._buffers = [None, None]
+        self._back = 0  # the buffer the worker may write
+        self._ready = None  # (view, published_at) of a frame the GUI hasn't taken
+
+    def set_quality(self, quality):
+        # GUI thread; an unknown name (old or hand-edited settings) falls back to smooth
+        self.quality = quality if quality in QUALITIES else "smooth"
+
+    def submit(self, view, own_geometry):
+        # GUI thread; view = (physical region, output width, output height in device
+        # pixels, pixel ratio, logical window placement); own_geometry is physical
+        with self._cond:
+            if self._request is not None:
+                self.dropped += 1
+            self._request = (view, own_geometry)
+            self._cond.notify()
+
+    def take(self):
+        """GUI thread: (frame, view, published_at) of the newest frame, or None.
+
+        The returned image stays untouched until the next take().
+        """
+        with self._cond:
+            if self._ready is None:
+                return None
+            view, published_at = self._ready
+            frame = self._buffers[self._back][1]
+            self._back ^= 1
+            self._ready = None
+            self._cond.notify()
+        return frame, view, published_at
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    def run(self):
+        # mss and X connections belong to the thread that opened them
+        sct = mss.mss()
+        damage = damage_watcher()
+        tile_hash = TileHash()
+        last_view = None
+        try:
+            while True:
+                with self._cond:
+                    while self._running and (self._request is None or self._ready is not None):
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    view, own_geometry = self._request
+                    self._request = None
+                region = view[0]
+                # a new quality setting redraws like a move does
+                moved = (view, self.quality) != last_view
+                if damage is not None:
+                    if not damage.dirty(region, own_geometry) and not moved:
+                        continue
+                    last_view = (view, self.quality)
+                    self.render(sct, view)
+                else:
+                    # no damage events: grab anyway and compare a hash of the tile
+                    last_view = (view, self.quality)
+                    self.render(sct, view, tile_hash, force=moved)
+        except Exception as e:
+            print(f"Capture failed: {e}")
+        finally:
+            sct.close()
+            if damage is not None:
+                damage.close()
+
+    @staticmethod
+    def new_buffer(width, height):
+        # BGRA bytes in memory are what Qt calls RGB32 on little-endian hosts, so
+        # the image is a view of the array the resampler writes
+        pixels = np.empty((height, width, 4), np.uint8)
+        return pixels, QImage(pixels.data, width, height, width * 4, QImage.Format_RGB32)
+
+    def render(self, sct, view, tile_hash=None, force=True):
+        # grab and scale one frame; skipped if the tile hash shows no change (unless forced)
+        region, width, height, dpr = view[:4]
+        capture_x, capture_y, capture_width, capture_height = region
+        start = time.perf_counter()
+        sct_img = sct.grab({
+            "top": capture_y,
+            "left": capture_x,
+            "width": capture_width,
+            "height": capture_height,
+        })
+        grabbed = time.perf_counter()
+        if tile_hash is not None and not tile_hash.changed(sct_img.raw) and not force:
+            return
+
+        # one scaling pass, straight into the back buffer
+        buffer = self._buffers[self._back]
+        if buffer is None or buffer[0].shape[:2] != (height, width):
+            buffer = self._buffers[self._back] = self.new_buffer(width, height)
+        buffer[1].setDevicePixelRatio(dpr)
+        src_w, src_h = sct_img.size
+        quality = self.quality
+        if quality == "smooth":
+            # the capture buffer wrapped as it is (sct_img.raw, not .bgra, which copies)
+            source = QImage(sct_img.raw, src_w, src_h, src_w * 4, QImage.Format_RGB32)
+            painter = QPainter(buffer[1])
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            # the target is in the frame's logical pixels
+            painter.drawImage(QRectF(0, 0, width / dpr, height / dpr), source)
+            painter.end()
+            del source  # the QImage must not outlive the buffer it wraps
+        else:
+            # the same buffer as an array, for the NumPy kernels
+            source = np.frombuffer(sct_img.raw, np.uint8).reshape(src_h, src_w, 4)
+            self.resampler.mode = quality
+            self.resampler.scale(source, buffer[0])
+        scaled = time.perf_counter()
+
+        self.times.add("capture", grabbed - start)
+        self.times.add("scale", scaled - grabbed)
+        with self._cond:
+            self._ready = (view, scaled)
+        self.frame_ready.emit()
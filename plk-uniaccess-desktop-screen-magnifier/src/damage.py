@@ -0,0 +1,77 @@
+import sys
+import zlib
+
+
+def _overlaps(a, b):
+    # a, b: (left, top, width, height)
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _inside(a, b):
+    return b[0] <= a[0] and b[1] <= a[1] and a[0] + a[2] <= b[0] + b[2] and a[1] + a[3] <= b[1] + b[3]
+
+
+class XDamageWatcher:
+    """Tells whether part of the screen was repainted since the last check.
+
+    Uses the X11 DAMAGE extension on the root window, so nothing has to be
+    captured to find out that nothing changed.
+    """
+
+    def __init__(self, display_name=None):
+        from Xlib import display
+        from Xlib.ext import damage
+        self.display = display.Display(display_name)
+        if not self.display.has_extension("DAMAGE"):
+            raise OSError("X server has no DAMAGE extension")
+        self.display.damage_query_version()
+        self.root = self.display.screen().root
+        # one event per newly damaged rectangle until the damage is subtracted
+        self.damage = self.root.damage_create(damage.DamageReportDeltaRectangles)
+        self.notify = self.display.extension_event.DamageNotify
+        self.display.flush()
+
+    def dirty(self, region, ignore=None):
+        """True if anything inside region (left, top, width, height) was repainted.
+
+        Rectangles that lie entirely inside ignore (our own window) don't count.
+        """
+        hit = False
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type != self.notify:
+                continue
+            area = (event.area.x, event.area.y, event.area.width, event.area.height)
+            if _overlaps(area, region) and not (ignore and _inside(area, ignore)):
+                hit = True
+        self.display.damage_subtract(self.damage)
+        self.display.flush()
+        return hit
+
+    def close(self):
+        self.display.damage_destroy(self.damage)
+        self.display.close()
+
+
+class TileHash:
+    """Fallback for platforms without damage events: the tile has to be grabbed,
+    but a CRC of its pixels tells whether it needs rescaling and repainting."""
+
+    def __init__(self):
+        self.last = None
+
+    def changed(self, raw):
+        crc = zlib.crc32(raw)
+        changed = crc != self.last
+        self.last = crc
+        return changed
+
+
+def damage_watcher():
+    """XDamageWatcher on X11, or None when damage has to be detected by hashing."""
+    if sys.platform.startswith("linux"):
+        try:
+            return XDamageWatcher()
+        except Exception as e:
+            print(f"XDamage unavailable, hashing captured tiles instead: {e}")
+    return None
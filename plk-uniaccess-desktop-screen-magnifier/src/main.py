@@ -1,16 +1,17 @@
 import sys
 import os
 import json
+import time
 from PySide6.QtWidgets import (QApplication, QWidget, QLabel, QMainWindow, 
                                QPushButton, QVBoxLayout, QHBoxLayout, QSlider, 
                                QSpinBox, QDialog, QSystemTrayIcon, QMenu)
-from PySide6.QtGui import QPixmap, QImage, QCursor, QIcon, QAction
-from PySide6.QtCore import Qt, QTimer, Slot
-import mss
-from PIL import Image
+from PySide6.QtGui import QPainter, QCursor, QIcon, QAction
+from PySide6.QtCore import Qt, QTimer, QPoint, Slot
 from appdirs import user_config_dir
 
 from settings import SettingsDialog
+from capture import CaptureWorker, FrameStats
+from monitors import MonitorMap
 
 class ConfigManager:
     def __init__(self):
@@ -35,24 +36,46 @@ class ConfigManager:
         return {
             "default_mode": "windowed",
             "docked_position": "top",
-            "zoom_level": 2.0
+            "zoom_level": 2.0,
+            "quality": "smooth",
+            "debug": False
         }
 
 class Magnifier(QWidget):
+    ACTIVE_INTERVAL = 16  # ms, ~60 FPS; the cursor is read this often even when idle
+    IDLE_INTERVAL = 200  # ms between screen checks while nothing changes
+    IDLE_AFTER = 0.5  # seconds without changes before dropping to the idle rate
+
     def __init__(self):
         super().__init__()
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
-        self.label = QLabel(self)
-        self.sct = mss.mss()
+        # we paint every pixel ourselves; skip Qt's background fill
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.monitors = MonitorMap()  # screen geometry, updated when Qt reports changes
         self.zoom_level = 2.0
-        
+        self.debug = False  # per-frame logging and FPS/CPU reports
+
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_magnifier)
-        
+
         self.magnifier_size = 200
+        # the frame on screen, owned by the worker until the next one is taken
+        self.frame = None
+        self.frame_published = 0.0
+
+        # capture and scaling run here; it re-captures only when the cursor moved
+        # or the region under it changed, and we fall to the idle rate otherwise
+        self.worker = CaptureWorker(parent=self)
+        self.worker.frame_ready.connect(self.present_frame)
+        self.worker.start()
+        QApplication.instance().aboutToQuit.connect(self.worker.stop)
+        self.last_change = 0.0
+        self.last_pos = None  # cursor position at the last tick
+        self.last_submit = 0.0
+        self.stats = FrameStats()
 
     def start(self):
-        self.timer.start(16)  # ~60 FPS
+        self.timer.start(self.ACTIVE_INTERVAL)
         self.show()
 
     def stop(self):
@@ -61,9 +84,25 @@ class Magnifier(QWidget):
 
     def set_zoom(self, zoom):
         self.zoom_level = zoom
+        self.last_change = time.perf_counter()
+
+    def set_quality(self, quality):
+        # "smooth" (Qt), or the NumPy "nearest", "bilinear" or "bicubic"; applies from the next frame
+        self.worker.set_quality(quality)
+        self.last_change = time.perf_counter()
 
     def update_magnifier(self):
+        now = time.perf_counter()
         pos = QCursor.pos()
+        # the cursor is cheap to read, so it is polled every tick: a move is
+        # followed at once; only the capture and damage checks are throttled
+        if pos != self.last_pos:
+            self.last_pos = pos
+            self.last_change = now
+        idle = now - self.last_change > self.IDLE_AFTER
+        if idle and now - self.last_submit < self.IDLE_INTERVAL / 1000:
+            return
+        self.last_submit = now
         mouse_x, mouse_y = pos.x(), pos.y()
 
         width, height = self.magnifier_size, self.magnifier_size
@@ -75,40 +114,64 @@ class Magnifier(QWidget):
         capture_x = mouse_x - capture_width // 2
         capture_y = mouse_y - capture_height // 2
 
-        # Get monitor dimensions
-        monitor = self.sct.monitors[1]
-
-        # Clamp coordinates to be within the screen bounds
-        capture_x = max(monitor["left"], min(capture_x, monitor["left"] + monitor["width"] - capture_width))
-        capture_y = max(monitor["top"], min(capture_y, monitor["top"] + monitor["height"] - capture_height))
-
-        grab_region = {
-            "top": capture_y,
-            "left": capture_x,
-            "width": capture_width,
-            "height": capture_height,
-        }
-        
-        sct_img = self.sct.grab(grab_region)
-        print(f"Screen shot taken: {sct_img}")
-
-        img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-        print(f"PIL image created: {img}")
-
-        magnified_img = img.resize((width, height), Image.Resampling.BICUBIC)
-        print(f"Image resized: {magnified_img}")
-
-        q_img = QImage(magnified_img.tobytes(), magnified_img.width, magnified_img.height, QImage.Format_RGB888)
-        print(f"QImage created: {q_img}")
-
-        pixmap = QPixmap.fromImage(q_img)
-        print(f"Pixmap created: {pixmap}")
-        
-        self.label.setPixmap(pixmap)
-        self.resize(width, height)
-        
+        # Clamp to the monitor under the cursor, then convert to the physical
+        # pixels capture works in, so HiDPI screens are grabbed at full detail
+        # without grabbing more than the box shows
+        monitor = self.monitors.at(mouse_x, mouse_y)
+        if monitor is None:
+            return
+        capture_x, capture_y = monitor.clamp(capture_x, capture_y, capture_width, capture_height)
+        region = monitor.to_physical(capture_x, capture_y, capture_width, capture_height)
+
+        # the frame is rendered at the window's own pixel ratio
+        dpr = self.devicePixelRatioF()
         # Offset the window so it doesn't cover the cursor
-        self.move(mouse_x - width // 2, mouse_y - height // 2 - 120)
+        placement = (mouse_x - width // 2, mouse_y - height // 2 - 120, width, height)
+        geometry = self.frameGeometry()
+        own = self.monitors.at(geometry.center().x(), geometry.center().y())
+        self.worker.submit((region, round(width * dpr), round(height * dpr), dpr, placement),
+                           own.to_physical(geometry.x(), geometry.y(), geometry.width(), geometry.height()))
+
+        self.stats.tick()
+        if now - self.stats.started >= 1.0:
+            if self.debug:
+                print(self.stats.summary(now, "idle" if idle else "active"))
+                print(f"  {self.worker.times.summary()}, {self.worker.dropped} requests dropped")
+            self.stats.reset(now)
+
+    @Slot()
+    def present_frame(self):
+        taken = self.worker.take()
+        if taken is None:
+            return
+        self.frame, view, self.frame_published = taken
+        x, y, width, height = view[4]
+        self.stats.presented()
+        self.last_change = time.perf_counter()
+
+        if self.width() != width or self.height() != height:
+            self.resize(width, height)
+        target = QPoint(x, y)
+        if self.pos() != target:
+            self.move(target)
+        self.update()
+
+    def paintEvent(self, event):
+        if self.frame is None:
+            return
+        painter = QPainter(self)
+        # the image carries its pixel ratio, so it covers the window 1:1 in device pixels
+        painter.drawImage(0, 0, self.frame)
+        painter.end()
+        if self.frame_published:
+            # publish -> on screen, including the wait for this paint
+            times = self.worker.times
+            times.add("present", time.perf_counter() - self.frame_published)
+            if self.debug:
+                print(f"Frame {self.frame.width()}x{self.frame.height()}: capture "
+                      f"{times.last('capture') * 1e3:.2f} ms, scale {times.last('scale') * 1e3:.2f} ms, "
+                      f"present {times.last('present') * 1e3:.2f} ms")
+            self.frame_published = 0.0
 
 class MainWindow(QMainWindow):
     def __init__(self, config_manager):
@@ -179,6 +242,8 @@ class MainWindow(QMainWindow):
 
     def load_initial_settings(self):
         settings = self.config_manager.load_settings()
+        self.magnifier.debug = settings.get("debug", False)
+        self.magnifier.set_quality(settings.get("quality", "smooth"))
         self.update_zoom(int(settings.get("zoom_level", 2.0) * 2))
         self.zoom_slider.setValue(int(settings.get("zoom_level", 2.0) * 2))
         
@@ -239,7 +304,9 @@ class MainWindow(QMainWindow):
         dialog = SettingsDialog(self)
         dialog.set_settings(self.config_manager.settings)
         if dialog.exec():
-            self.config_manager.save_settings(dialog.get_settings())
+            # keep keys the dialog doesn't edit (zoom_level, debug)
+            self.config_manager.save_settings({**self.config_manager.settings, **dialog.get_settings()})
+            self.magnifier.set_quality(self.config_manager.settings.get("quality", "smooth"))
 
     def closeEvent(self, event):
         event.ignore()
@@ -0,0 +1,116 @@
+from math import gcd
+
+from PySide6.QtGui import QGuiApplication
+
+MAX_CELLS = 1 << 16  # lookup grid size limit; larger layouts scan the list
+
+
+class Monitor:
+    """One screen: its logical geometry (Qt/cursor coordinates) and pixel ratio."""
+
+    def __init__(self, screen):
+        geometry = screen.geometry()
+        self.name = screen.name()
+        self.left, self.top = geometry.x(), geometry.y()
+        self.width, self.height = geometry.width(), geometry.height()
+        self.dpr = screen.devicePixelRatio()
+
+    def contains(self, x, y):
+        return self.left <= x < self.left + self.width and self.top <= y < self.top + self.height
+
+    def clamp(self, x, y, width, height):
+        """Move the box (x, y, width, height) inside the monitor."""
+        x = max(self.left, min(x, self.left + self.width - width))
+        y = max(self.top, min(y, self.top + self.height - height))
+        return x, y
+
+    def to_physical(self, x, y, width, height):
+        """Logical box to the physical pixels that capture sees.
+
+        Qt keeps each screen's top-left corner in device pixels and scales
+        from there, so offsets inside the screen are multiplied by its ratio.
+        """
+        dpr = self.dpr
+        return (round(self.left + (x - self.left) * dpr), round(self.top + (y - self.top) * dpr),
+                round(width * dpr), round(height * dpr))
+
+
+class MonitorMap:
+    """The screens, rebuilt only when Qt reports a change.
+
+    Lookups go through a grid whose cell size divides every screen edge, so
+    each cell lies on exactly one screen (or none) and finding the screen
+    under the cursor is one division and one index.
+    """
+
+    def __init__(self):
+        app = QGuiApplication.instance()
+        app.screenAdded.connect(self.on_screen_added)
+        app.screenRemoved.connect(self.refresh)
+        app.primaryScreenChanged.connect(self.refresh)
+        self.monitors = []
+        for screen in QGuiApplication.screens():
+            self.watch(screen)
+        self.refresh()
+
+    def watch(self, screen):
+        screen.geometryChanged.connect(self.refresh)
+        screen.physicalDotsPerInchChanged.connect(self.refresh)
+
+    def on_screen_added(self, screen):
+        self.watch(screen)
+        self.refresh()
+
+    def refresh(self, *args):
+        primary = QGuiApplication.primaryScreen()
+        screens = QGuiApplication.screens()
+        # primary first: it answers when the cursor is somewhere unexpected
+        screens.sort(key=lambda screen: screen != primary)
+        self.monitors = [Monitor(screen) for screen in screens]
+        self.build_grid()
+
+    def build_grid(self):
+        self.grid = None
+        if not self.monitors:
+            return
+        self.left = min(m.left for m in self.monitors)
+        self.top = min(m.top for m in self.monitors)
+        right = max(m.left + m.width for m in self.monitors)
+        bottom = max(m.top + m.height for m in self.monitors)
+        cell = 0
+        for m in self.monitors:
+            for edge in (m.left - self.left, m.left + m.width - self.left,
+                         m.top - self.top, m.top + m.height - self.top):
+                cell = gcd(cell, edge)
+        self.cell = max(cell, 1)
+        self.cols = -(-(right - self.left) // self.cell)
+        self.rows = -(-(bottom - self.top) // self.cell)
+        if self.cols * self.rows > MAX_CELLS:
+            return
+        grid = [-1] * (self.cols * self.rows)
+        # filled last to first, so where screens overlap the first one wins
+        for i in reversed(range(len(self.monitors))):
+            m = self.monitors[i]
+            c0, r0 = (m.left - self.left) // self.cell, (m.top - self.top) // self.cell
+            c1, r1 = c0 + m.width // self.cell, r0 + m.height // self.cell
+            for row in range(r0, r1):
+                grid[row * self.cols + c0:row * self.cols + c1] = [i] * (c1 - c0)
+        self.grid = grid
+
+    def at(self, x, y):
+        """The monitor under the logical point (x, y), or the nearest one."""
+        if self.grid is not None:
+            col, row = (x - self.left) // self.cell, (y - self.top) // self.cell
+            if 0 <= col < self.cols and 0 <= row < self.rows:
+                i = self.grid[row * self.cols + col]
+                if i >= 0:
+                    return self.monitors[i]
+        else:
+            for m in self.monitors:
+                if m.contains(x, y):
+                    return m
+        if not self.monitors:
+            return None
+        # in a gap between screens of different sizes
+        return min(self.monitors, key=lambda m: (max(m.left - x, 0, x - m.left - m.width + 1) ** 2 +
+                                                 max(m.top - y, 0, y - m.top - m.height + 1) ** 2))
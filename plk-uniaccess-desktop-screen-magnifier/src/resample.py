@@ -0,0 +1,128 @@
+from collections import OrderedDict
+
+import numpy as np
+
+MODES = ("nearest", "bilinear", "bicubic")
+# rendering qualities: Qt's own filtered scaling (the default), or one of the NumPy modes
+QUALITIES = ("smooth",) + MODES
+
+
+def _cubic(t, a=-0.5):
+    # Keys' cubic convolution kernel (the one PIL and most scalers call bicubic)
+    t = np.abs(t)
+    return np.where(t <= 1, ((a + 2) * t - (a + 3)) * t * t + 1,
+                    np.where(t < 2, ((a * t - 5 * a) * t + 8 * a) * t - 4 * a, 0.0))
+
+
+def axis_table(src, dst, mode):
+    """Source indices and weights for scaling one axis from src to dst pixels.
+
+    Returns (indices, weights), each of shape (taps, dst); every output pixel
+    is the weighted sum of its taps. Nearest has one tap with weight 1.
+    """
+    # centre of each output pixel, in source pixel coordinates
+    x = (np.arange(dst) + 0.5) * (src / dst) - 0.5
+    if mode == "nearest":
+        idx = np.clip(np.floor(x + 0.5), 0, src - 1).astype(np.intp)
+        return idx[None, :], np.ones((1, dst), np.float32)
+    if mode == "bilinear":
+        base = np.floor(x)
+        offsets = np.arange(2)
+        weights = 1 - np.abs(x[None, :] - (base[None, :] + offsets[:, None]))
+    else:
+        base = np.floor(x) - 1
+        offsets = np.arange(4)
+        weights = _cubic(x[None, :] - (base[None, :] + offsets[:, None]))
+    idx = np.clip(base[None, :] + offsets[:, None], 0, src - 1).astype(np.intp)
+    weights /= weights.sum(axis=0)  # clamped edges and the cubic's rounding
+    return idx, weights.astype(np.float32)
+
+
+class Kernel:
+    """Tables and scratch buffers for one (source size, output size, mode)."""
+
+    BLOCK = 1 << 16  # floats per block of output rows, small enough to stay in cache
+
+    def __init__(self, src_w, src_h, dst_w, dst_h, mode):
+        self.mode = mode
+        self.ix, wx = axis_table(src_w, dst_w, mode)
+        self.iy, self.wy = axis_table(src_h, dst_h, mode)
+        # one weight per channel: broadcasting a weight over the 4 channels of a
+        # pixel is several times slower than multiplying two contiguous arrays
+        self.wx = np.ascontiguousarray(np.repeat(wx[:, :, None], 4, axis=2))
+        # horizontal pass over the (small) source, then vertical to full size,
+        # a block of rows at a time
+        self.block = max(1, self.BLOCK // (dst_w * 4))
+        block = min(self.block, max(src_h, dst_h))
+        if mode == "nearest":
+            self.rows = np.empty((src_h, dst_w, 4), np.uint8)
+        else:
+            self.rows = np.empty((src_h, dst_w, 4), np.float32)
+            self.cols = np.empty((block, dst_w, 4), np.uint8)
+            self.acc = np.empty((block, dst_w * 4), np.float32)
+            self.tap = np.empty((block, dst_w * 4), np.float32)
+
+    def apply(self, src, out):
+        """Scale src (h, w, 4) uint8 into out (H, W, 4) uint8."""
+        if self.mode == "nearest":
+            # pure index copies: columns, then whole rows
+            np.take(src, self.ix[0], axis=1, out=self.rows)
+            np.take(self.rows, self.iy[0], axis=0, out=out)
+            return out
+        rows, block = self.rows, self.block
+        for r0 in range(0, len(rows), block):
+            r1 = min(r0 + block, len(rows))
+            acc = rows[r0:r1]
+            cols, tap = self.cols[:r1 - r0], self.tap[:r1 - r0].reshape(acc.shape)
+            for k in range(len(self.ix)):
+                np.take(src[r0:r1], self.ix[k], axis=1, out=cols)
+                np.multiply(cols, self.wx[k], out=acc if k == 0 else tap)
+                if k:
+                    acc += tap
+        flat = rows.reshape(len(rows), -1)
+        out_flat = out.reshape(len(out), -1)
+        for r0 in range(0, len(out), block):
+            r1 = min(r0 + block, len(out))
+            acc, tap = self.acc[:r1 - r0], self.tap[:r1 - r0]
+            for k in range(len(self.iy)):
+                np.take(flat, self.iy[k, r0:r1], axis=0, out=acc if k == 0 else tap)
+                if k:
+                    tap *= self.wy[k, r0:r1, None]
+                    acc += tap
+                else:
+                    acc *= self.wy[0, r0:r1, None]
+            if self.mode == "bicubic":
+                np.clip(acc, 0, 255, out=acc)
+            acc += 0.5
+            np.copyto(out_flat[r0:r1], acc, casting="unsafe")  # truncates; rounded by the +0.5
+        return out
+
+
+class Resampler:
+    """Scales BGRA frames with per-size kernels cached across frames.
+
+    The zoom slider moves in 0.5 steps and the output size rarely changes, so
+    a handful of kernels covers a session.
+    """
+
+    def __init__(self, mode="bilinear", max_kernels=16):
+        self.mode = mode if mode in MODES else "bilinear"
+        self.max_kernels = max_kernels
+        self.kernels = OrderedDict()
+
+    def kernel(self, src_w, src_h, dst_w, dst_h):
+        # LRU: switching zoom back and forth reuses the tables
+        key = (src_w, src_h, dst_w, dst_h, self.mode)
+        kernel = self.kernels.get(key)
+        if kernel is None:
+            kernel = self.kernels[key] = Kernel(*key)
+            if len(self.kernels) > self.max_kernels:
+                self.kernels.popitem(last=False)
+        else:
+            self.kernels.move_to_end(key)
+        return kernel
+
+    def scale(self, src, out):
+        h, w = src.shape[:2]
+        dst_h, dst_w = out.shape[:2]
+        return self.kernel(w, h, dst_w, dst_h).apply(src, out)
@@ -22,6 +22,13 @@ class SettingsDialog(QDialog):
         self.layout.addWidget(self.dock_position_label)
         self.layout.addWidget(self.dock_position_combo)
 
+        # --- Rendering Quality ---
+        self.quality_label = QLabel("Rendering Quality:")
+        self.quality_combo = QComboBox()
+        self.quality_combo.addItems(["Smooth", "Nearest", "Bilinear", "Bicubic"])
+        self.layout.addWidget(self.quality_label)
+        self.layout.addWidget(self.quality_combo)
+
         # --- Buttons ---
         self.button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         self.button_box.accepted.connect(self.accept)
@@ -31,9 +38,11 @@ class SettingsDialog(QDialog):
     def get_settings(self):
         return {
             "default_mode": self.mode_combo.currentText().lower(),
-            "docked_position": self.dock_position_combo.currentText().lower()
+            "docked_position": self.dock_position_combo.currentText().lower(),
+            "quality": self.quality_combo.currentText().lower()
         }
 
     def set_settings(self, settings):
         self.mode_combo.setCurrentText(settings.get("default_mode", "windowed").capitalize())
         self.dock_position_combo.setCurrentText(settings.get("docked_position", "top").capitalize())
+        self.quality_combo.setCurrentText(settings.get("quality", "smooth").capitalize())
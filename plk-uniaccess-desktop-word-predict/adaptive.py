@@ -0,0 +1,230 @@
+# Online learning from what the user types. Committed words go into a separate
+# UserModel whose counts decay with a configurable half-life; MixedModel blends it
+# with the corpus model at query time.
+#
+# Decay is O(1) per word: instead of shrinking every count as time passes, each
+# new observation is added with weight exp(rate * (t - t0)), which grows over time.
+# Ratios between counts are what predictions use, so the common factor cancels;
+# when weights get large everything is rescaled once and t0 moves forward.
+#
+# observe() only enqueues, so the keyboard hook never waits on the model. A worker
+# thread applies updates and appends them to a plain-text log that is replayed at
+# startup and compacted into a snapshot when it grows too long.
+import os, math, time, queue, threading, heapq, tempfile
+from collections import defaultdict
+from prediction import PredictionModel
+
+_REBASE_AT = 1e12  # rescale stored counts before the growing weights get this large
+_FORGET_BELOW = 0.01  # decayed counts dropped when compacting the log
+_CONFIDENT_AT = 200.0  # typed words at which the user model gets half its weight
+
+class UserModel(PredictionModel):
+    def __init__(self, path=None, half_life_days=14.0, flush_interval=30.0,
+                 max_log_lines=100000, top_n=200):
+        super().__init__(top_n)
+        self.path = path
+        self.rate = math.log(2) / (half_life_days * 86400.0)
+        self.flush_interval = flush_interval
+        self.max_log_lines = max_log_lines
+        self.t0 = time.time()
+        self.lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._log = []  # lines not written yet
+        self._log_lines = 0
+        self._thread = None
+        if path and os.path.exists(path):
+            try:
+                os.chmod(path, 0o600)  # logs from older versions were world-readable
+            except OSError:
+                pass
+            self._replay(path)
+
+    # ---- keystroke side ----
+
+    def observe(self, prev, word):
+        # called from the key hook for every committed word; never blocks
+        self._queue.put((time.time(), prev, word))
+
+    # ---- worker side ----
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        # stop the worker and write out anything still buffered
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._flush_log()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                return
+            if item:
+                t, prev, word = item
+                self._learn(t, prev, word)
+            if self._log and time.monotonic() - last_flush >= self.flush_interval:
+                self._flush_log()
+                last_flush = time.monotonic()
+
+    def _learn(self, t, prev, word, log=True):
+        prev_tokens = self.tokenizer.tokenize(prev) if prev else []
+        prev = prev_tokens[-1] if prev_tokens else None
+        for w in self.tokenizer.tokenize(word):
+            with self.lock:
+                self._add_unigram(t, 1.0, w)
+                if prev is not None:
+                    self._add_bigram(t, 1.0, prev, w)
+            if log:
+                self._log.append('o\t%.3f\t%s\t%s\n' % (t, prev or '', w))
+            prev = w
+
+    def _weight(self, t, count):
+        # stored weight of `count` real counts observed at time t
+        w = count * math.exp(self.rate * (t - self.t0))
+        if w > _REBASE_AT:
+            self._rebase(t)
+            w = count * math.exp(self.rate * (t - self.t0))
+        return w
+
+    def _add_unigram(self, t, count, word):
+        w = self._weight(t, count)
+        self.unigrams[word] += w
+        self.total_unigrams += w
+        self.vocab.add(word)
+        self.index.bump(word)
+        self.version += 1
+
+    def _add_bigram(self, t, count, prev, word):
+        w = self._weight(t, count)
+        self.bigrams[prev][word] += w
+        self.bigram_totals[prev] += w
+        self.version += 1
+
+    def _rebase(self, t):
+        f = math.exp(-self.rate * (t - self.t0))
+        for w in self.unigrams:
+            self.unigrams[w] *= f
+        for row in self.bigrams.values():
+            for w in row:
+                row[w] *= f
+        for w in self.bigram_totals:
+            self.bigram_totals[w] *= f
+        self.total_unigrams *= f
+        self.index.rescale(f)
+        self.t0 = t
+
+    def confidence(self):
+        # 0..1, grows with the amount of (decayed) typing seen so far
+        with self.lock:
+            n = self.total_unigrams * math.exp(-self.rate * (time.time() - self.t0))
+        return n / (n + _CONFIDENT_AT)
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        with self.lock:
+            return super().predict_scored(prefix, prev_word, k, lambda_context, context)
+
+    # ---- persistence ----
+    # o <t> <prev> <word>        one observation
+    # u <t> <count> <word>       snapshot unigram, count as of time t
+    # b <t> <count> <prev> <word> snapshot bigram
+
+    def _replay(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._log_lines += 1
+                    p = line.rstrip('\n').split('\t')
+                    try:
+                        if p[0] == 'o' and len(p) == 4:
+                            self._learn(float(p[1]), p[2] or None, p[3], log=False)
+                        elif p[0] == 'u' and len(p) == 4:
+                            self._add_unigram(float(p[1]), float(p[2]), p[3])
+                        elif p[0] == 'b' and len(p) == 5:
+                            self._add_bigram(float(p[1]), float(p[2]), p[3], p[4])
+                    except ValueError:
+                        continue  # torn last line after a crash
+        except OSError as e:
+            print('Failed to read user model:', e)
+
+    def _flush_log(self):
+        if not self.path or not self._log:
+            return
+        lines, self._log = self._log, []
+        try:
+            # the log holds typed words: readable by the user only
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            self._log_lines += len(lines)
+        except OSError as e:
+            print('Failed to save user model:', e)
+            return
+        if self._log_lines > self.max_log_lines:
+            self._compact()
+
+    def _compact(self):
+        # rewrite the log as a snapshot of the current decayed counts
+        now = time.time()
+        with self.lock:
+            f = math.exp(-self.rate * (now - self.t0))
+            lines = ['u\t%.3f\t%.6g\t%s\n' % (now, c * f, w)
+                     for w, c in self.unigrams.items() if c * f >= _FORGET_BELOW]
+            lines += ['b\t%.3f\t%.6g\t%s\t%s\n' % (now, c * f, p, w)
+                      for p, row in self.bigrams.items() for w, c in row.items() if c * f >= _FORGET_BELOW]
+        # mkstemp creates the file 0600, like the log it replaces
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as out:
+                out.writelines(lines)
+            os.replace(tmp, self.path)
+            self._log_lines = len(lines)
+        except OSError as e:
+            os.unlink(tmp)
+            print('Failed to compact user model:', e)
+
+class MixedModel:
+    # corpus model blended with the user model; same predict() API as the engines
+    def __init__(self, base, user, user_weight=0.3):
+        self.base = base
+        self.user = user
+        self.user_weight = user_weight
+
+    @property
+    def order(self):
+        # words of context that matter: the base model's (the user model is a bigram model)
+        return getattr(self.base, 'order', 2)
+
+    @property
+    def version(self):
+        # changes when either model learns, the base model is replaced or the user
+        # model's blend weight drifts (its confidence decays with time, not events)
+        return (id(self.base), self.base.version, self.user.version, round(self._weight(), 3))
+
+    def _weight(self):
+        return self.user_weight * self.user.confidence()
+
+    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        return [w for _, w in self.predict_scored(prefix, prev_word, k, lambda_context, context)]
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        base = self.base.predict_scored(prefix, prev_word, k, lambda_context, context)
+        weight = self._weight()
+        if weight <= 0:
+            return base
+        user = self.user.predict_scored(prefix, prev_word, k, lambda_context)
+        # a word missing from one list scores 0 there
+        scores = defaultdict(float)
+        for s, w in base:
+            scores[w] += (1 - weight) * s
+        for s, w in user:
+            scores[w] += weight * s
+        return heapq.nlargest(k, ((s, w) for w, s in scores.items()))
@@ -0,0 +1,173 @@
+# Headless end-to-end benchmark: no Qt, no keyboard hook. Trains each engine on
+# the first part of a corpus, then replays the held-out rest key by key through
+# the same typing context and predictor stack the app uses, and reports
+#   - training throughput (MB/s) and peak RSS of the engine's process
+#   - p50/p99 latency per keystroke
+#   - keystroke savings at each k: the share of keys saved when the user picks
+#     the word (one key, space included) as soon as it shows in the top k
+# Every engine runs in a fresh process so RSS and timings don't leak across runs.
+#   python bench.py corpus.txt [--engines dict,compact,kneser_ney,mapped] [--ks 1,3,6]
+#                              [--cache] [--fuzzy 1] [--test-words 5000] [--json]
+import os, sys, json, time, argparse, tempfile
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import resource
+except ImportError:  # Windows: no RSS column
+    resource = None
+from context import TextContext
+from tokenizer import tokenize, normalize, grapheme_len
+
+ENGINES = ('dict', 'compact', 'kneser_ney', 'mapped')
+
+def split_corpus(path, test_fraction, out_dir):
+    # last test_fraction of the file (cut at whitespace) is held out
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.seek(int(size * (1 - test_fraction)))
+        f.readline()
+        cut = f.tell()
+        f.seek(0)
+        train = os.path.join(out_dir, 'train.txt')
+        with open(train, 'wb') as out:
+            remaining = cut
+            while remaining:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                out.write(block)
+                remaining -= len(block)
+        test = f.read().decode('utf-8', 'replace')
+    return train, test
+
+def build(engine, train, out_dir):
+    if engine == 'compact':
+        from compact_model import CompactModel
+        model = CompactModel()
+    elif engine == 'kneser_ney':
+        from kneser_ney import KneserNeyModel
+        model = KneserNeyModel(order=3, min_count=2, prune_threshold=1e-9)
+    else:
+        from prediction import PredictionModel
+        model = PredictionModel()
+    model.train_from_file(train)
+    model.predict('a', 'the')  # finish any deferred merges inside the timed part
+    if engine == 'mapped':
+        from model_file import save_model, load_model
+        path = os.path.join(out_dir, 'model.bin')
+        save_model(model, path)
+        model = load_model(path)
+    return model
+
+def replay(predictor, text, ks, max_words, min_prefix=1, lambda_context=0.7):
+    # type `text` word by word; returns (latencies, {k: keys saved}, chars typed)
+    kmax = max(ks)
+    ctx = TextContext()
+    lat = []
+    saved = {k: 0 for k in ks}
+    chars = 0
+    for n, raw in enumerate(text.split()):
+        if n >= max_words:
+            break
+        chars += len(raw) + 1  # the word and its space
+        words = tokenize(raw)
+        target = words[0] if len(words) == 1 and normalize(raw).startswith(words[0]) else None
+        first_hit = {}  # k -> keys typed before the word showed in the top k
+        for i, ch in enumerate(raw):
+            ctx.type_char(ch)
+            prefix, prev_words = ctx.snapshot()
+            if target is None or i >= len(target) or grapheme_len(prefix) < min_prefix:
+                continue
+            t = time.perf_counter()
+            got = predictor.predict(prefix, prev_words[-1] if prev_words else None, kmax,
+                                    lambda_context, list(prev_words[-3:]))
+            lat.append(time.perf_counter() - t)
+            if target in got:
+                rank = got.index(target)
+                for k in ks:
+                    if rank < k and k not in first_hit:
+                        first_hit[k] = i + 1
+            if len(first_hit) == len(ks):
+                break
+        ctx.current = raw if target is None else raw[:len(target)]
+        ctx.separator()
+        for k, typed in first_hit.items():
+            # picking the word costs one key and brings its space along
+            saved[k] += (len(target) + 1) - (typed + 1)
+    return lat, saved, chars
+
+def run(engine, train, test, args):
+    out_dir = os.path.dirname(train)
+    size = os.path.getsize(train)
+    t = time.perf_counter()
+    model = build(engine, train, out_dir)
+    train_s = time.perf_counter() - t
+    predictor = model
+    if args.cache:
+        from cache import CachedPredictor
+        predictor = CachedPredictor(predictor)
+    if args.fuzzy:
+        from fuzzy import FuzzyPredictor
+        predictor = FuzzyPredictor(predictor, args.fuzzy)
+    ks = [int(k) for k in args.ks.split(',')]
+    lat, saved, chars = replay(predictor, test, ks, args.test_words)
+    lat.sort()
+    pct = lambda q: lat[min(int(len(lat) * q), len(lat) - 1)] if lat else 0.0
+    return {
+        'engine': engine,
+        'train_mb_s': size / 1e6 / train_s,
+        'peak_rss_mb': peak_rss_mb(),
+        'queries': len(lat),
+        'p50_us': pct(0.5) * 1e6,
+        'p99_us': pct(0.99) * 1e6,
+        'savings': {k: saved[k] / max(chars, 1) for k in ks},
+    }
+
+def peak_rss_mb():
+    # peak resident set of this process, or None where it can't be read
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('corpus', nargs='?', help='text file; a synthetic corpus if omitted')
+    ap.add_argument('--engines', default='dict,compact,mapped')
+    ap.add_argument('--ks', default='1,3,6,9')
+    ap.add_argument('--test-fraction', type=float, default=0.1)
+    ap.add_argument('--test-words', type=int, default=5000)
+    ap.add_argument('--cache', action='store_true', help='put the LRU cache in front')
+    ap.add_argument('--fuzzy', type=int, default=0, help='typo tolerance (edits)')
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args()
+    engines = args.engines.split(',')
+    for e in engines:
+        if e not in ENGINES:
+            ap.error('unknown engine %r (choose from %s)' % (e, ', '.join(ENGINES)))
+    out_dir = tempfile.mkdtemp()
+    path = args.corpus
+    if not path:
+        from bench_storage import synthetic_corpus
+        path = os.path.join(out_dir, 'corpus.txt')
+        synthetic_corpus(path, 1000000)
+    train, test = split_corpus(path, args.test_fraction, out_dir)
+    results = []
+    for engine in engines:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run, engine, train, test, args).result())
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    ks = args.ks.split(',')
+    print('%-12s %9s %9s %9s %9s ' % ('engine', 'train MB/s', 'RSS MB', 'p50 us', 'p99 us') +
+          ' '.join('%7s' % ('KSR@' + k) for k in ks))
+    for r in results:
+        rss = '%9.1f' % r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '%9s' % '-'
+        print('%-12s %9.2f %s %9.1f %9.1f ' % (r['engine'], r['train_mb_s'], rss,
+                                              r['p50_us'], r['p99_us']) +
+              ' '.join('%6.1f%%' % (100 * r['savings'][int(k)]) for k in ks))
+
+if __name__ == '__main__':
+    main()
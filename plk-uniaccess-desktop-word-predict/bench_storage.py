@@ -0,0 +1,66 @@
+# Compare memory use and query latency of the dict-based PredictionModel and the
+# array-backed CompactModel. Uses the given corpus file, or a synthetic Zipf corpus.
+#   python bench_storage.py [corpus.txt] [--words N]
+import time, random, string, tracemalloc, argparse, tempfile, os
+from prediction import PredictionModel
+from compact_model import CompactModel
+
+def synthetic_corpus(path, n_words, vocab=50000, seed=1):
+    rnd = random.Random(seed)
+    words = [''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(2, 9)))
+             for _ in range(vocab)]
+    weights = [1.0 / (r + 1) for r in range(vocab)]
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(n_words // 1000):
+            f.write(' '.join(rnd.choices(words, weights, k=1000)))
+            f.write('\n')
+
+def queries(path, n, seed=2):
+    rnd = random.Random(seed)
+    with open(path, encoding='utf-8') as f:
+        tokens = f.read(1 << 20).lower().split()
+    out = []
+    for _ in range(n):
+        i = rnd.randrange(1, len(tokens))
+        w = tokens[i]
+        out.append((w[:rnd.randint(1, min(3, len(w)))], tokens[i - 1]))
+    return out
+
+def measure(cls, path, qs):
+    tracemalloc.start()
+    t = time.perf_counter()
+    model = cls()
+    model.train_from_file(path)
+    train_s = time.perf_counter() - t
+    model.predict('a', 'the')  # merge any buffered counts before measuring
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    lat = []
+    for prefix, prev in qs:
+        t = time.perf_counter()
+        model.predict(prefix, prev)
+        lat.append(time.perf_counter() - t)
+    lat.sort()
+    return train_s, mem, lat[len(lat) // 2], lat[int(len(lat) * 0.99)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('corpus', nargs='?')
+    ap.add_argument('--words', type=int, default=2000000, help='synthetic corpus size')
+    ap.add_argument('--queries', type=int, default=5000)
+    args = ap.parse_args()
+    path = args.corpus
+    tmp = None
+    if not path:
+        tmp = path = os.path.join(tempfile.mkdtemp(), 'corpus.txt')
+        synthetic_corpus(path, args.words)
+    qs = queries(path, args.queries)
+    print('%-16s %10s %12s %10s %10s' % ('engine', 'train s', 'memory MB', 'p50 us', 'p99 us'))
+    for cls in (PredictionModel, CompactModel):
+        train_s, mem, p50, p99 = measure(cls, path, qs)
+        print('%-16s %10.2f %12.1f %10.1f %10.1f' % (cls.__name__, train_s, mem / 1e6, p50 * 1e6, p99 * 1e6))
+    if tmp:
+        os.unlink(tmp)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Tokenizer throughput per script, against the old ASCII-only pattern.
+#   python bench_tokenizer.py [--mb N]
+import re, time, random, argparse
+from tokenizer import Tokenizer
+
+SAMPLES = {
+    'english': "the quick brown fox jumps over the lazy dog and doesn't stop",
+    'latin-accented': "café naïve façade über straße señor crème brûlée déjà vu",
+    'devanagari': "मैं हर दिन किताब पढ़ता हूँ और क्षत्रिय कथाएँ सुनता हूँ",
+    'mixed': "मैं café में बैठकर किताब पढ़ता हूँ the quick brown fox",
+    'digits': "order 66 of 2024 arrived at gate_7 with 3 boxes",
+}
+
+def corpus(sample, n_bytes, seed=1):
+    rnd = random.Random(seed)
+    words = sample.split()
+    out = []
+    size = 0
+    while size < n_bytes:
+        line = ' '.join(rnd.choice(words) for _ in range(20)) + '.\n'
+        out.append(line)
+        size += len(line.encode('utf-8'))
+    return ''.join(out)
+
+def rate(fn, text, repeat=3):
+    n = len(text.encode('utf-8'))
+    best = min(_timed(fn, text) for _ in range(repeat))
+    return n / best / 1e6
+
+def _timed(fn, text):
+    t = time.perf_counter()
+    fn(text)
+    return time.perf_counter() - t
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--mb', type=float, default=4, help='text per script')
+    args = ap.parse_args()
+    tok = Tokenizer()
+    old = re.compile(r"[a-zA-Z']+")
+    print('%-16s %12s %12s %8s' % ('script', 'MB/s', 'old MB/s', 'tokens'))
+    for name, sample in SAMPLES.items():
+        text = corpus(sample, int(args.mb * 1e6))
+        print('%-16s %12.1f %12.1f %8d' % (name, rate(tok.tokenize, text),
+                                          rate(lambda t: old.findall(t.lower()), text),
+                                          len(tok.tokenize(text))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Bounded LRU cache in front of any engine's predict_scored().
+#
+# An entry holds the best `pool` (score, word) pairs for (prefix, prev word,
+# lambda), so any k <= pool is a slice of it; engines of a higher `order` also key
+# on the last order-1 words of the context, the only ones they look at. Scores never depend on the
+# prefix itself, so when an entry came back with fewer than `pool` pairs it is the
+# complete list for its prefix, and a longer prefix ("the" after "th") is answered
+# by filtering it instead of querying the model again.
+#
+# The cache clears itself when the model's `version` changes (training, learning
+# from typed words, or swapping in another model).
+import threading
+from collections import OrderedDict
+from tokenizer import normalize
+
+class CachedPredictor:
+    def __init__(self, model, size=512, pool=32):
+        self.model = model
+        self.size = size
+        self.pool = pool
+        self.hits = 0
+        self.narrowed = 0  # hits answered by filtering a shorter prefix
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (pairs, complete)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        return [w for _, w in self.predict_scored(prefix, prev_word, k, lambda_context, context)]
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        prefix = normalize(prefix)
+        if prefix == "": return []
+        if k > self.pool:
+            return self.model.predict_scored(prefix, prev_word, k, lambda_context, context)
+        order = getattr(self.model, 'order', 2)
+        words = tuple(normalize(w) for w in context[-(order - 1):]) if context and order > 2 else None
+        ctx = (normalize(prev_word) if prev_word else None, words, lambda_context)
+        version = (id(self.model), getattr(self.model, 'version', None))
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get((ctx, prefix))
+            if entry is not None:
+                self._entries.move_to_end((ctx, prefix))
+                self.hits += 1
+                return entry[0][:k]
+            # the longest shorter prefix with a complete list, if any
+            for n in range(len(prefix) - 1, 0, -1):
+                entry = self._entries.get((ctx, prefix[:n]))
+                if entry is not None and entry[1]:
+                    pairs = [p for p in entry[0] if p[1].startswith(prefix)]
+                    self._store((ctx, prefix), pairs, True)
+                    self.hits += 1
+                    self.narrowed += 1
+                    return pairs[:k]
+            self.misses += 1
+        # query outside the lock; a version change meanwhile clears it next time
+        pairs = self.model.predict_scored(prefix, prev_word, self.pool, lambda_context, context)
+        with self._lock:
+            if version == self._version:
+                self._store((ctx, prefix), pairs, len(pairs) < self.pool)
+        return pairs[:k]
+
+    def _store(self, key, pairs, complete):
+        self._entries[key] = (pairs, complete)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'narrowed': self.narrowed, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0, 'entries': len(self._entries)}
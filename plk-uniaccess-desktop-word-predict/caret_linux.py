@@ -1,35 +1,274 @@
-# Linux caret fetching: try AT-SPI via pyatspi, fallback to xdotool geometry.
-import subprocess, shutil
-def get_caret_position():
-    # Try AT-SPI (pyatspi) first for accurate caret extents
-    try:
+# Linux caret fetching. A CaretTracker listens to AT-SPI focus and
+# text-caret-moved events and caches the focused text object and its last caret
+# extents, so get_caret_position() is a memory read instead of a walk over the
+# accessibility tree (one D-Bus round trip per node). When no event has arrived
+# for max_age seconds the focused object is asked directly; without AT-SPI the
+# active window geometry is used as a rough fallback, tracked over a persistent
+# X connection (python-xlib) or, failing that, read with xdotool.
+import subprocess, shutil, threading, time
+
+class CaretTracker:
+    def __init__(self, provider, max_age=1.0):
+        self.provider = provider
+        self.max_age = max_age
+        self.focused = None  # text object with keyboard focus
+        self.caret = None  # (x, y, monotonic time) of the caret's bottom-left corner
+        self.secure = False  # focus is in a password field
+        self.events = 0
+        self.queries = 0  # extents read outside the event path
+        provider.subscribe(self.on_focus, self.on_caret_moved)
+
+    def on_focus(self, obj):
+        # event thread: a text object gained focus, or None for anything else
+        # (a button, a list, a terminal); position() then falls back to the window
+        self.focused = obj
+        if obj is None:
+            self.events += 1
+            self.caret = None
+            self.secure = False
+            return
+        self.secure = self.provider.is_secure(obj)
+        self._update(obj, None)
+
+    def on_caret_moved(self, obj, offset):
+        # event thread: the caret moved inside obj
+        if obj is not self.focused:
+            self.secure = self.provider.is_secure(obj)
+        self.focused = obj
+        self._update(obj, offset)
+
+    def _update(self, obj, offset):
+        self.events += 1
+        pos = self.provider.extents(obj, offset)
+        if pos is not None:
+            self.caret = (pos[0], pos[1], time.monotonic())
+
+    def position(self):
+        caret = self.caret
+        if caret is not None and time.monotonic() - caret[2] <= self.max_age:
+            return caret[0], caret[1]
+        # no recent event (some toolkits only report focus): ask the focused object
+        obj = self.focused
+        if obj is not None:
+            self.queries += 1
+            pos = self.provider.extents(obj, None)
+            if pos is not None:
+                self.caret = (pos[0], pos[1], time.monotonic())
+                return pos
+        return None
+
+class AtspiProvider:
+    # AT-SPI events through pyatspi; the registry loop runs on a daemon thread
+    def __init__(self):
         import pyatspi
-        desktop = pyatspi.Registry.getDesktop(0)
-        # find focused application and text interface - this is a simplified attempt
-        for i in range(desktop.childCount):
-            app = desktop.getChildAtIndex(i)
-            if app.getState().contains(pyatspi.STATE_ACTIVE):
-                for j in range(app.childCount):
-                    c = app.getChildAtIndex(j)
-                    if c.getRoleName() in ('text', 'entry', 'editable text'):
-                        try:
-                            iface = c.queryText()
-                            (start, end) = iface.getCaretOffset()
-                            extents = iface.getCharacterExtents(start, pyatspi.DESKTOP_COORD_TYPE_SCREEN)
-                            return (int(extents.x), int(extents.y + extents.height))
-                        except Exception:
-                            continue
-    except Exception:
-        pass
-    # Fallback: xdotool to get active window geometry and approximate caret
-    try:
-        if shutil.which('xdotool') is None:
+        self.pyatspi = pyatspi
+
+    def subscribe(self, on_focus, on_caret_moved):
+        pyatspi = self.pyatspi
+
+        def listener(event):
+            try:
+                if event.type.startswith('object:text-caret-moved'):
+                    on_caret_moved(event.source, event.detail1)
+                elif event.detail1:
+                    on_focus(event.source if self._text(event.source) is not None else None)
+            except Exception:
+                pass  # objects can vanish while their events are queued
+        pyatspi.Registry.registerEventListener(listener, 'object:text-caret-moved',
+                                               'object:state-changed:focused')
+        threading.Thread(target=pyatspi.Registry.start, daemon=True).start()
+
+    def _text(self, obj):
+        try:
+            return obj.queryText()
+        except Exception:
             return None
-        wid = subprocess.check_output(['xdotool', 'getactivewindow']).strip()
-        geom = subprocess.check_output(['xdotool', 'getwindowgeometry', '--shell', wid]).decode()
-        geomd = dict(line.split('=') for line in geom.strip().splitlines())
-        x, y, h = int(geomd.get('X',0)), int(geomd.get('Y',0)), int(geomd.get('HEIGHT',0))
-        # crude approximation: return some offset inside window
-        return (x + 50, y + 50)
+
+    def is_secure(self, obj):
+        try:
+            return obj.getRole() == self.pyatspi.ROLE_PASSWORD_TEXT
+        except Exception:
+            return False
+
+    def extents(self, obj, offset):
+        # screen position of the caret's bottom-left corner, or None
+        text = self._text(obj)
+        if text is None:
+            return None
+        try:
+            if offset is None:
+                offset = text.caretOffset
+            e = text.getCharacterExtents(offset, self.pyatspi.DESKTOP_COORD_TYPE_SCREEN)
+            if e.height <= 0 and offset > 0:
+                # at the end of the text there is no character; use the last one
+                e = text.getCharacterExtents(offset - 1, self.pyatspi.DESKTOP_COORD_TYPE_SCREEN)
+                return (int(e.x + e.width), int(e.y + e.height))
+            return (int(e.x), int(e.y + e.height))
+        except Exception:
+            return None
+
+class FakeProvider:
+    # stands in for the accessibility bus when testing headless: objects are
+    # keys into a table of caret extents per offset
+    def __init__(self):
+        self.extent_table = {}  # obj -> {offset: (x, y)}
+        self.offsets = {}  # obj -> current caret offset
+        self.secure = set()  # password fields
+        self.calls = 0
+        self._focus = self._caret = None
+
+    def subscribe(self, on_focus, on_caret_moved):
+        self._focus, self._caret = on_focus, on_caret_moved
+
+    def focus(self, obj):
+        self._focus(obj)
+
+    def move_caret(self, obj, offset):
+        self.offsets[obj] = offset
+        self._caret(obj, offset)
+
+    def is_secure(self, obj):
+        return obj in self.secure
+
+    def extents(self, obj, offset):
+        self.calls += 1
+        if offset is None:
+            offset = self.offsets.get(obj, 0)
+        return self.extent_table.get(obj, {}).get(offset)
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def _get_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            try:
+                _tracker = CaretTracker(AtspiProvider())
+            except Exception:
+                _tracker = False  # no pyatspi / accessibility bus
+        return _tracker
+
+def secure_field():
+    # True when the focused field is a password entry; nothing typed there is learned
+    tracker = _get_tracker()
+    return bool(tracker) and tracker.secure
+
+def get_caret_position():
+    tracker = _get_tracker()
+    if tracker:
+        pos = tracker.position()
+        if pos is not None:
+            return pos
+    return _window_position()
+
+class X11WindowTracker:
+    # geometry of the active window over one persistent X connection. A daemon
+    # thread follows _NET_ACTIVE_WINDOW through PropertyNotify on the root window
+    # and ConfigureNotify on the active window; position() only reads the cache.
+    def __init__(self, display_name=None):
+        from Xlib import X, display, error
+        self.X = X
+        self.closed_error = error.ConnectionClosedError
+        self.display = display.Display(display_name)
+        self.root = self.display.screen().root
+        self.active_atom = self.display.intern_atom('_NET_ACTIVE_WINDOW')
+        self.window = None
+        self.geometry = None  # (x, y, width, height) in root coordinates
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._refresh()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        X = self.X
+        while True:
+            try:
+                event = self.display.next_event()
+                if event.type == X.PropertyNotify and event.atom == self.active_atom:
+                    self._refresh()
+                elif event.type == X.ConfigureNotify and self.window is not None \
+                        and event.window.id == self.window.id:
+                    self._update_geometry()
+            except self.closed_error:
+                return
+            except Exception:
+                time.sleep(0.1)  # window destroyed under us; wait for the next change
+
+    def _refresh(self):
+        prop = self.root.get_full_property(self.active_atom, self.X.AnyPropertyType)
+        wid = prop.value[0] if prop is not None and len(prop.value) else 0
+        if not wid:
+            self.window = None
+            self.geometry = None
+            return
+        self.window = self.display.create_resource_object('window', wid)
+        try:
+            self.window.change_attributes(event_mask=self.X.StructureNotifyMask)
+        except Exception:
+            pass
+        self._update_geometry()
+
+    def _update_geometry(self):
+        try:
+            g = self.window.get_geometry()
+            origin = self.root.translate_coords(self.window, 0, 0)
+            self.geometry = (origin.x, origin.y, g.width, g.height)
+        except Exception:
+            self.geometry = None
+
+    def position(self):
+        # crude approximation: some offset inside the active window
+        g = self.geometry
+        return (g[0] + 50, g[1] + 50) if g else None
+
+    def close(self):
+        self.display.close()
+
+_x11 = None
+_x11_lock = threading.Lock()
+
+def _get_x11():
+    # called from the hook and worker threads; only one of them opens the connection
+    global _x11
+    with _x11_lock:
+        if _x11 is None:
+            try:
+                _x11 = X11WindowTracker()
+            except Exception:
+                _x11 = False  # no python-xlib or no X server (e.g. Wayland)
+        return _x11
+
+def _window_position():
+    x11 = _get_x11()
+    if x11:
+        return x11.position()
+    return _xdotool_position()
+
+def active_window():
+    # id of the active X window, used to keep typing context per window
+    x11 = _get_x11()
+    w = x11.window if x11 else None
+    return w.id if w is not None else None
+
+_window_cache = (None, 0.0)
+
+def _xdotool_position(max_age=1.0):
+    # xdotool to get active window geometry and approximate caret; cached so a
+    # burst of keys forks it at most once per max_age
+    global _window_cache
+    pos, when = _window_cache
+    if time.monotonic() - when <= max_age:
+        return pos
+    pos = None
+    try:
+        if shutil.which('xdotool') is not None:
+            wid = subprocess.check_output(['xdotool', 'getactivewindow']).strip()
+            geom = subprocess.check_output(['xdotool', 'getwindowgeometry', '--shell', wid]).decode()
+            geomd = dict(line.split('=') for line in geom.strip().splitlines())
+            x, y = int(geomd.get('X', 0)), int(geomd.get('Y', 0))
+            # crude approximation: return some offset inside window
+            pos = (x + 50, y + 50)
     except Exception:
-        return None
+        pos = None
+    _window_cache = (pos, time.monotonic())
+    return pos
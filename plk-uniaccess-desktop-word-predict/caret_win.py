@@ -36,3 +36,31 @@ def get_caret_position():
     except Exception as e:
         # fallback
         return None
+
+def active_window():
+    # id of the foreground window, used to keep typing context per window
+    try:
+        return user32.GetForegroundWindow()
+    except Exception:
+        return None
+
+ES_PASSWORD = 0x20
+GWL_STYLE = -16
+
+def secure_field():
+    # True when keyboard focus is in a password edit control; nothing typed there is learned
+    try:
+        hwnd = user32.GetForegroundWindow()
+        thread_id = user32.GetWindowThreadProcessId(hwnd, None)
+        info = GUITHREADINFO()
+        info.cbSize = ctypes.sizeof(GUITHREADINFO)
+        if not user32.GetGUIThreadInfo(thread_id, ctypes.byref(info)) or not info.hwndFocus:
+            return False
+        name = ctypes.create_unicode_buffer(64)
+        user32.GetClassNameW(info.hwndFocus, name, 64)
+        # ES_PASSWORD means something else for other window classes
+        if 'edit' not in name.value.lower():
+            return False
+        return bool(user32.GetWindowLongW(info.hwndFocus, GWL_STYLE) & ES_PASSWORD)
+    except Exception:
+        return False
@@ -0,0 +1,168 @@
+# Integer-id storage engine for the prediction model. Words are interned to ids,
+# unigram counts and bigram row totals live in NumPy arrays indexed by id, and
+# bigrams are one sorted array of packed (prev_id << 32 | next_id) keys with a
+# parallel count array. New bigrams are buffered as raw packed keys and merged in
+# bulk, so training stays vectorized and memory is a few bytes per bigram instead
+# of a Counter entry per bigram.
+import numpy as np
+from prediction import PredictionModel, top_k
+from tokenizer import DEFAULT as DEFAULT_TOKENIZER, normalize
+from prefix_index import PrefixTrie
+
+_FLUSH_KEYS = 1 << 22  # buffered bigram occurrences before a merge (32 MB)
+
+class _CountView:
+    # word -> count mapping over an id-indexed array, for the prefix trie and saving
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+
+    def __getitem__(self, word):
+        i = self.model.ids.get(word)
+        return int(getattr(self.model, self.name)[i]) if i is not None else 0
+
+class CompactModel(PredictionModel):
+    # drop-in replacement for PredictionModel: same training and predict() API
+    def __init__(self, top_n=200, tokenizer=None):
+        self.tokenizer = tokenizer or DEFAULT_TOKENIZER
+        self.ids = {}  # word -> id
+        self.words = []  # id -> word
+        self.vocab = self.ids.keys()
+        self.total_unigrams = 0
+        self.version = 0
+        self._uni = np.zeros(1024, dtype=np.int64)  # capacity grows by doubling
+        self._totals = np.zeros(1024, dtype=np.int64)  # bigram row totals
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._pending = []  # arrays of packed keys not merged yet
+        self._pending_len = 0
+        self.unigrams = _CountView(self, '_uni')
+        self.bigram_totals = _CountView(self, '_totals')
+        self.index = PrefixTrie(self.unigrams, top_n)
+
+    def _intern(self, tokens):
+        ids = self.ids
+        out = np.empty(len(tokens), dtype=np.int64)
+        for n, t in enumerate(tokens):
+            i = ids.get(t)
+            if i is None:
+                i = ids[t] = len(self.words)
+                self.words.append(t)
+            out[n] = i
+        if len(self.words) > len(self._uni):
+            size = max(len(self.words), 2 * len(self._uni))
+            self._uni = np.concatenate([self._uni, np.zeros(size - len(self._uni), dtype=np.int64)])
+            self._totals = np.concatenate([self._totals, np.zeros(size - len(self._totals), dtype=np.int64)])
+        return out
+
+    def _train_tokens(self, tokens, prev=None):
+        if not tokens:
+            return prev
+        ids = self._intern(tokens)
+        v = len(self.words)
+        self._uni[:v] += np.bincount(ids, minlength=v)
+        self.total_unigrams += len(ids)
+        if prev is not None:
+            ids = np.concatenate([[self.ids[prev]], ids])
+        if len(ids) > 1:
+            self._totals[:v] += np.bincount(ids[:-1], minlength=v)
+            self._buffer((ids[:-1].astype(np.uint64) << np.uint64(32)) | ids[1:].astype(np.uint64))
+        self.index.update(set(tokens))
+        self.version += 1
+        return tokens[-1]
+
+    def _merge_counts(self, unigrams, bigrams):
+        # fold Counters from a parallel training shard into the arrays
+        if unigrams:
+            ids = self._intern(list(unigrams))
+            self._uni[ids] += np.fromiter(unigrams.values(), np.int64, len(unigrams))
+            self.total_unigrams += sum(unigrams.values())
+        keys, counts = [], []
+        for prev, row in bigrams.items():
+            p = self._intern([prev])[0]
+            nxt = self._intern(list(row))
+            c = np.fromiter(row.values(), np.int64, len(row))
+            self._totals[p] += c.sum()
+            keys.append((np.uint64(p) << np.uint64(32)) | nxt.astype(np.uint64))
+            counts.append(c)
+        if keys:
+            self._merge(np.concatenate(keys), np.concatenate(counts))
+        self.version += 1
+
+    def _buffer(self, keys):
+        self._pending.append(keys)
+        self._pending_len += len(keys)
+        if self._pending_len >= _FLUSH_KEYS:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        keys, counts = np.unique(np.concatenate(self._pending), return_counts=True)
+        self._pending = []
+        self._pending_len = 0
+        self._merge(keys, counts)
+
+    def _merge(self, keys, counts):
+        # add (keys, counts) into the sorted arrays: bump existing keys in place,
+        # insert the new ones in one pass
+        order = np.argsort(keys, kind='stable')
+        keys, counts = keys[order], counts[order]
+        if len(keys) > 1 and not np.all(keys[1:] != keys[:-1]):
+            keys, inv = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inv, weights=counts).astype(np.int64)
+        pos = np.searchsorted(self._keys, keys)
+        hit = pos < len(self._keys)
+        hit[hit] = self._keys[pos[hit]] == keys[hit]
+        self._counts[pos[hit]] += counts[hit]
+        new = ~hit
+        if new.any():
+            self._keys = np.insert(self._keys, pos[new], keys[new])
+            self._counts = np.insert(self._counts, pos[new], counts[new])
+
+    def _row(self, p):
+        # (next ids, counts) of context id p
+        self._flush()
+        lo, hi = np.searchsorted(self._keys, [np.uint64(p) << np.uint64(32),
+                                              np.uint64(p + 1) << np.uint64(32)])
+        return (self._keys[lo:hi] & np.uint64(0xffffffff)).astype(np.int64), self._counts[lo:hi]
+
+    def bigram_row(self, word):
+        p = self.ids.get(word)
+        if p is None:
+            return None
+        cols, counts = self._row(p)
+        if not len(cols):
+            return None
+        return {self.words[j]: c for j, c in zip(cols.tolist(), counts.tolist())}
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        prefix = normalize(prefix)
+        if prefix == "": return []
+        candidates = self._prefix_candidates(prefix)
+        row = None
+        row_total = 0
+        p = self.ids.get(normalize(prev_word)) if prev_word else None
+        if p is not None and candidates:
+            cols, counts = self._row(p)
+            if len(cols):
+                # intersect the row with the candidates by searching the smaller
+                # array in the larger sorted one
+                cand = np.array([self.ids[w] for w in candidates], dtype=np.int64)
+                if len(cols) < len(cand):
+                    cand.sort()
+                    pos = np.minimum(np.searchsorted(cand, cols), len(cand) - 1)
+                    hit = cand[pos] == cols
+                    row = {self.words[j]: c for j, c in zip(cols[hit].tolist(), counts[hit].tolist())}
+                else:
+                    pos = np.minimum(np.searchsorted(cols, cand), len(cols) - 1)
+                    hit = cols[pos] == cand
+                    row = {self.words[j]: c for j, c in zip(cand[hit].tolist(), counts[pos[hit]].tolist())}
+                row_total = int(self._totals[p])
+        return top_k(candidates, self.unigrams.__getitem__, self.total_unigrams,
+                     row, row_total, k, lambda_context)
+
+    def nbytes(self):
+        # bytes held by the count arrays (the vocabulary and trie are extra)
+        return (self._uni.nbytes + self._totals.nbytes + self._keys.nbytes +
+                self._counts.nbytes + sum(a.nbytes for a in self._pending))
@@ -1,16 +1,112 @@
-import json, os
+import json, os, sys, time, struct, tempfile, threading
+from types import MappingProxyType
+
+# Settings are read once into a read-only snapshot. load() hands that snapshot
+# out and only re-reads the file after it changed on disk: an inotify watch on
+# the config directory flags changes where available, elsewhere the file's mtime
+# is checked at most once per CHECK_INTERVAL.
+CHECK_INTERVAL = 1.0
+
 class Config:
-    def __init__(self, path=None):
+    def __init__(self, path=None, watch=True):
         self.path = path or (os.path.join(os.path.expanduser('~'), '.wordq_config.json'))
+        self.lock = threading.Lock()
+        self.snapshot = MappingProxyType({})
+        self._stamp = None  # (mtime_ns, size) of the file behind the snapshot
+        self._checked = 0.0
+        self._dirty = True
+        self._watching = watch and _watch_dir(os.path.dirname(os.path.abspath(self.path)),
+                                              os.path.basename(self.path), self._changed)
+    def _changed(self):
+        self._dirty = True
     def load(self):
-        try:
-            with open(self.path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return {}
+        # read-only mapping of the current settings; cheap to call per keystroke
+        if not self._watching and not self._dirty:
+            now = time.monotonic()
+            if now - self._checked >= CHECK_INTERVAL:
+                self._checked = now
+                if _stamp(self.path) != self._stamp:
+                    self._dirty = True
+        if self._dirty:
+            self._reload()
+        return self.snapshot
+    def _reload(self):
+        with self.lock:
+            self._dirty = False
+            stamp = _stamp(self.path)
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception:
+                data = {}
+            self._stamp = stamp
+            self.snapshot = MappingProxyType(data if isinstance(data, dict) else {})
     def save(self, data):
+        # write to a temp file and rename over the config, so readers (and other
+        # processes) never see a half-written file
         try:
-            with open(self.path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(dict(data), f, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
         except Exception as e:
             print('Failed to save config:', e)
+            return
+        with self.lock:
+            self.snapshot = MappingProxyType(dict(data))
+            self._stamp = _stamp(self.path)
+            self._dirty = False
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+# ---- inotify (Linux), through ctypes ----
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+def _watch_dir(directory, name, callback):
+    # call callback() from a daemon thread whenever `name` in `directory` is
+    # written, replaced or removed. Returns False where inotify is unavailable.
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init()
+        if fd < 0:
+            return False
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            os.close(fd)
+            return False
+    except (OSError, AttributeError):
+        return False
+    target = name.encode()
+    def run():
+        while True:
+            try:
+                buf = os.read(fd, 4096)
+            except OSError:
+                return
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                _, _, _, n = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                if buf[pos:pos + n].rstrip(b'\0') == target:
+                    callback()
+                pos += n
+    threading.Thread(target=run, daemon=True).start()
+    return True
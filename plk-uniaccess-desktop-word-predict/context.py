@@ -0,0 +1,71 @@
+# Typing context per window. Each context keeps the word being typed and a ring
+# of the last few completed words, updated key by key, so memory per window is
+# fixed and nothing re-splits a growing buffer. Contexts are keyed by the active
+# window id and the least recently used ones are dropped.
+from collections import deque, OrderedDict
+
+MAX_WORDS = 8  # completed words remembered per window
+MAX_WORD_CHARS = 64  # longer runs without a separator are not words anyway
+
+class TextContext:
+    __slots__ = ('words', 'gaps', 'current', 'gap')
+
+    def __init__(self):
+        self.words = deque(maxlen=MAX_WORDS)  # completed words, oldest first
+        self.gaps = deque(maxlen=MAX_WORDS)  # separators typed before each of them
+        self.current = ''  # word being typed
+        self.gap = 0  # separators between the last completed word and current
+
+    def type_char(self, ch):
+        if len(self.current) < MAX_WORD_CHARS:
+            self.current += ch
+
+    def separator(self):
+        # space/enter/tab: returns (prev, word) when it completed a word, else None
+        if not self.current:
+            self.gap += 1
+            return None
+        prev = self.words[-1] if self.words else None
+        word = self.current
+        self.words.append(word)
+        self.gaps.append(self.gap)
+        self.current = ''
+        self.gap = 1
+        return prev, word
+
+    def backspace(self):
+        if self.current:
+            self.current = self.current[:-1]
+        elif self.gap > 0:
+            self.gap -= 1
+            if self.gap == 0 and self.words:
+                # back into the previous word
+                self.current = self.words.pop()
+                self.gap = self.gaps.pop()
+        else:
+            self.reset()  # deleting into text we never saw
+
+    def reset(self):
+        self.words.clear()
+        self.gaps.clear()
+        self.current = ''
+        self.gap = 0
+
+    def snapshot(self):
+        # (prefix, earlier words oldest first); immutable, safe to hand to a thread
+        return self.current, tuple(self.words)
+
+class ContextTracker:
+    def __init__(self, max_windows=32):
+        self.max_windows = max_windows
+        self._contexts = OrderedDict()  # window id -> TextContext
+
+    def get(self, window):
+        ctx = self._contexts.get(window)
+        if ctx is None:
+            ctx = self._contexts[window] = TextContext()
+            if len(self._contexts) > self.max_windows:
+                self._contexts.popitem(last=False)
+        else:
+            self._contexts.move_to_end(window)
+        return ctx
@@ -0,0 +1,148 @@
+# Typo-tolerant completion. The typed prefix is matched against the prefix trie
+# with a bounded Damerau-Levenshtein (optimal string alignment) distance. One edit
+# (the default) is found by looking up each single edit of the prefix in the trie;
+# larger budgets run a DP with one row per trie depth, abandoning a branch as
+# soon as every cell of its row exceeds the budget, so only a thin band of the
+# trie is visited.
+#
+# Each matching trie path is then completed by the wrapped engine itself, so
+# fuzzy suggestions get the usual unigram/bigram (or Kneser-Ney) scores, scaled
+# down by `penalty` per edit. A path is skipped when an ancestor already matched
+# at no greater distance, since the ancestor's completions cover it.
+import heapq
+from contextlib import nullcontext
+from tokenizer import normalize, grapheme_len
+
+def fuzzy_paths(root, children, query, max_edits):
+    # trie paths within max_edits of query; children(node) -> (char, child) pairs.
+    # Returns [(path, distance)].
+    m = len(query)
+    over = max_edits + 1  # any distance above the budget
+    out = []
+    # (node, path, row, previous row, best distance matched on the way here)
+    stack = [(root, '', list(range(m + 1)), None, over)]
+    while stack:
+        node, path, row, prev_row, best = stack.pop()
+        j = len(path) + 1
+        # only cells within max_edits of the diagonal can stay in budget
+        lo, hi = max(1, j - max_edits), min(m, j + max_edits)
+        # letters the band can't match (or transpose) all give the same row
+        chars = query[max(0, lo - 2):hi]
+        rows = {}
+        for ch, child in children(node):
+            key = ch if ch in chars else None
+            r = rows.get(key)
+            if r is None:
+                new = [over] * (m + 1)
+                new[0] = j if j < over else over
+                for i in range(lo, hi + 1):
+                    d = min(new[i - 1] + 1, row[i] + 1, row[i - 1] + (query[i - 1] != ch))
+                    # adjacent transposition: query "..ab" against path "..ba"
+                    if (prev_row is not None and i > 1 and query[i - 1] == path[-1]
+                            and query[i - 2] == ch):
+                        d = min(d, prev_row[i - 2] + 1)
+                    new[i] = d if d < over else over
+                # no extension of this path can get below the smallest cell of its row
+                r = rows[key] = (new, min(new))
+            new, low = r
+            if low >= over:
+                continue
+            p = path + ch
+            dist = new[m]
+            child_best = best
+            if dist < best:
+                out.append((p, dist))
+                child_best = dist
+            if low < child_best:
+                stack.append((child, p, new, row, child_best))
+    return out
+
+def one_edit_paths(root, children, child, query):
+    # fuzzy_paths(root, children, query, 1) without the DP: every string one edit
+    # from query shares a prefix query[:i] with it, so the single substitutions,
+    # insertions, deletions and transpositions are looked up from the trie node
+    # of each query[:i]. child(node, char) -> child node or None.
+    def follow(node, s):
+        for ch in s:
+            node = child(node, ch)
+            if node is None:
+                return None
+        return node
+    m = len(query)
+    found = set()
+    node = root
+    for i in range(m):
+        rest, after = query[i:], query[i + 1:]
+        for ch, c in children(node):
+            if ch != query[i] and follow(c, after) is not None:
+                found.add(query[:i] + ch + after)
+            if follow(c, rest) is not None:
+                found.add(query[:i] + ch + rest)
+        if follow(node, after) is not None:
+            found.add(query[:i] + after)
+        if i + 1 < m and query[i] != query[i + 1]:
+            swapped = query[i + 1] + query[i] + query[i + 2:]
+            if follow(node, swapped) is not None:
+                found.add(query[:i] + swapped)
+        node = child(node, query[i])
+        if node is None:
+            break
+    # like fuzzy_paths, drop paths below another match (or below query itself)
+    exact = node is not None
+    if exact:
+        found.add(query)
+    out = [(p, 1) for p in found if p and p != query and not any(p[:j] in found for j in range(1, len(p)))]
+    if exact:
+        out.append((query, 0))
+    return out
+
+def _tries(model):
+    # (root, children, child, lock) for every vocabulary trie behind a model or
+    # wrapper; lock guards a trie another thread grows (the user model's), else None
+    if hasattr(model, 'model'):  # CachedPredictor
+        return _tries(model.model)
+    if hasattr(model, 'base'):  # MixedModel
+        return _tries(model.base) + _tries(model.user)
+    if hasattr(model, 'index'):
+        return [(model.index.root, lambda n: n.children.items(), lambda n, ch: n.children.get(ch),
+                 getattr(model, 'lock', None))]
+    if hasattr(model, '_children'):  # MappedModel
+        return [(0, model._children, model._child, None)]
+    return []
+
+class FuzzyPredictor:
+    # wraps any engine (or cache); same predict() API plus typo tolerance
+    def __init__(self, model, max_edits=1, penalty=0.1):
+        self.model = model
+        self.max_edits = max_edits
+        self.penalty = penalty
+
+    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        return [w for _, w in self.predict_scored(prefix, prev_word, k, lambda_context, context)]
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        prefix = normalize(prefix)
+        # one edit per three typed letters, so short prefixes don't match everything
+        edits = min(self.max_edits, grapheme_len(prefix) // 3)
+        if edits == 0:
+            return self.model.predict_scored(prefix, prev_word, k, lambda_context, context)
+        paths = {}
+        for root, children, child, lock in _tries(self.model):
+            # the user model's learner inserts trie children while we walk them
+            with lock or nullcontext():
+                if edits == 1:
+                    found = one_edit_paths(root, children, child, prefix)
+                else:
+                    found = fuzzy_paths(root, children, prefix, edits)
+            for p, d in found:
+                if d < paths.get(p, edits + 1):
+                    paths[p] = d
+        paths[prefix] = 0
+        best = {}
+        for p, d in paths.items():
+            scale = self.penalty ** d
+            for score, w in self.model.predict_scored(p, prev_word, k, lambda_context, context):
+                s = score * scale
+                if s > best.get(w, -1.0):
+                    best[w] = s
+        return heapq.nlargest(k, ((s, w) for w, s in best.items()))
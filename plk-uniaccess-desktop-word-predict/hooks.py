@@ -1,13 +1,99 @@
-# Global keyboard hook using pynput. Captures keys and maintains a simple text buffer per active window.
+# Global keyboard hook using pynput. Captures keys and maintains the typing context of each window.
 from pynput import keyboard
-import threading, time
+import sys, threading, time
+from collections import deque
+from context import ContextTracker
+from tokenizer import normalize
+from inject import AcceptStats
+
+# keys that move the caret somewhere we can't follow
+_MOVE_KEYS = {keyboard.Key.left, keyboard.Key.right, keyboard.Key.up, keyboard.Key.down,
+              keyboard.Key.home, keyboard.Key.end, keyboard.Key.page_up, keyboard.Key.page_down,
+              keyboard.Key.esc}
+_FKEYS = [keyboard.Key.f1, keyboard.Key.f2, keyboard.Key.f3, keyboard.Key.f4, keyboard.Key.f5,
+          keyboard.Key.f6, keyboard.Key.f7, keyboard.Key.f8, keyboard.Key.f9]
+_SHIFT = {keyboard.Key.shift, keyboard.Key.shift_l, keyboard.Key.shift_r}
+# accept keys pressed with any of these are left to the application (Alt+F4, Ctrl+1, ...)
+_MODIFIERS = _SHIFT | {keyboard.Key.ctrl, keyboard.Key.ctrl_l, keyboard.Key.ctrl_r,
+                       keyboard.Key.alt, keyboard.Key.alt_l, keyboard.Key.alt_r, keyboard.Key.alt_gr,
+                       keyboard.Key.cmd, keyboard.Key.cmd_l, keyboard.Key.cmd_r}
+
+# low-level hook messages and virtual keys (Windows)
+WM_KEYDOWN, WM_KEYUP, WM_SYSKEYDOWN, WM_SYSKEYUP = 0x100, 0x101, 0x104, 0x105
+LLKHF_INJECTED = 0x10
+VK_F1 = 0x70
+VK_1 = 0x31
+
+
+class X11KeyGrab:
+    """Passive grabs on the accept keys while their popup rows are showing (X11).
+
+    A grabbed press goes to this connection instead of the focused window, so
+    the application never sees it; the pynput listener still does (XRecord).
+    Only the unmodified key is grabbed (Caps Lock and Num Lock aside).
+    """
+
+    def __init__(self, keysyms):
+        from Xlib import X, XK, display
+        self.X = X
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self.codes = [self.display.keysym_to_keycode(XK.string_to_keysym(name)) for name in keysyms]
+        self.masks = (0, X.LockMask, X.Mod2Mask, X.LockMask | X.Mod2Mask)
+        self.rows = 0  # codes[:rows] are grabbed
+
+    def grab(self, rows):
+        # GUI thread, on every popup change
+        X, root = self.X, self.root
+        for code in self.codes[rows:self.rows]:
+            for mask in self.masks:
+                root.ungrab_key(code, mask)
+        for code in self.codes[self.rows:rows]:
+            if code:
+                for mask in self.masks:
+                    root.grab_key(code, mask, False, X.GrabModeAsync, X.GrabModeAsync)
+        self.rows = rows
+        # the grabbed presses are delivered here; nothing needs them
+        while self.display.pending_events():
+            self.display.next_event()
+        self.display.flush()
+
+    def close(self):
+        self.grab(0)
+        self.display.close()
+
 
 class KeyHook:
-    def __init__(self, callback):
-        self.callback = callback  # callback(text_buffer, key_event)
-        self.buffer = ''
+    def __init__(self, callback, on_word=None, window=None, suggestion=None, injector=None,
+                 accept_keys='function'):
+        self.callback = callback  # callback((prefix, earlier words), key_event)
+        self.on_word = on_word  # on_word(prev_word, word) for each committed word
+        self.window = window  # window() -> id of the focused window, or None
+        self.suggestion = suggestion  # suggestion(row) -> word shown in that popup row, or None
+        self.injector = injector  # types accepted words; see inject.py
+        # F1-F9 pick a suggestion; with 'digits', 1-9 do while suggestions are showing
+        self.accept_digits = accept_keys == 'digits'
+        self.accept_stats = AcceptStats()
+        self._expected = deque()  # our own injected keys, still to be seen by the listener
+        self._held = set()  # modifiers currently down
+        self.contexts = ContextTracker()
         self.lock = threading.Lock()
-        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+        # accept keys that pick a suggestion are kept from the application: on Windows
+        # the low-level hook swallows them, on X11 they are grabbed while their row shows
+        self.win32 = sys.platform == 'win32'
+        self._swallowed = set()  # virtual keys whose release is swallowed too (Windows)
+        self.grab = None
+        if self.win32:
+            self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release,
+                                              win32_event_filter=self.win32_filter)
+        else:
+            self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+            if sys.platform.startswith('linux') and suggestion is not None and injector is not None:
+                try:
+                    self.grab = X11KeyGrab('123456789' if self.accept_digits
+                                           else ['F%d' % n for n in range(1, 10)])
+                except Exception as e:
+                    print('Failed to grab accept keys:', e)
         self.last_time = time.time()
 
     def start(self):
@@ -15,6 +101,16 @@ class KeyHook:
 
     def stop(self):
         self.listener.stop()
+        if self.grab is not None:
+            self.grab.close()
+
+    def show_rows(self, rows):
+        # GUI thread: the popup now shows `rows` suggestions (0 when hidden)
+        if self.grab is not None:
+            try:
+                self.grab.grab(rows)
+            except Exception as e:
+                print('Failed to grab accept keys:', e)
 
     def on_press(self, key):
         try:
@@ -22,18 +118,120 @@ class KeyHook:
         except AttributeError:
             k = None
         with self.lock:
+            if self._expected and self.is_injected(key, k):
+                return
+            if key in _MODIFIERS:
+                self._held.add(key)
+            ctx = self.contexts.get(self.window() if self.window else None)
+            # on Windows accept keys are handled (and swallowed) in win32_filter
+            row = None if self.win32 else self.accept_row(key, k)
+            if row is not None:
+                # a grabbed key never reached the application
+                swallowed = self.grab is not None and row < self.grab.rows
+                if self.accept(ctx, row, key, swallowed):
+                    return
             if k and k.isprintable():
-                self.buffer += k
+                if k.isspace():
+                    self.commit_word(ctx)
+                else:
+                    ctx.type_char(k)
             else:
-                # handle special keys: space, backspace, enter, tab
-                if key == keyboard.Key.space:
-                    self.buffer += ' '
+                # handle special keys: space, backspace, enter, tab, caret movement
+                if key in (keyboard.Key.space, keyboard.Key.enter, keyboard.Key.tab):
+                    self.commit_word(ctx)
                 elif key == keyboard.Key.backspace:
-                    self.buffer = self.buffer[:-1]
-                elif key in (keyboard.Key.enter, keyboard.Key.tab):
-                    self.buffer += ' '
-            # call callback in a separate thread to avoid blocking
-            threading.Thread(target=self.callback, args=(self.buffer, key), daemon=True).start()
+                    ctx.backspace()
+                elif key in _MOVE_KEYS:
+                    ctx.reset()
+            # the callback must return quickly (it hands off to the prediction worker)
+            self.callback(ctx.snapshot(), key)
+
+    def is_injected(self, key, k):
+        # swallow the echo of keys we injected, in the order the injector reported
+        # them; anything else means the user typed and the rest won't come
+        if key == keyboard.Key.space:
+            pressed = ' '
+        elif key == keyboard.Key.backspace:
+            pressed = 'backspace'
+        elif key in _SHIFT:
+            pressed = 'shift'
+        else:
+            pressed = k
+        if pressed == self._expected[0]:
+            self._expected.popleft()
+            return True
+        self._expected.clear()
+        return False
+
+    def accept_row(self, key, k):
+        if self.suggestion is None or self.injector is None or self._held:
+            return None
+        if key in _FKEYS:
+            return _FKEYS.index(key)
+        if self.accept_digits and k and k in '123456789':
+            return int(k) - 1
+        return None
+
+    def win32_filter(self, msg, data):
+        # low-level hook thread (Windows): accept and swallow a key that picks a
+        # shown suggestion; everything else goes on to on_press and the application
+        if data.flags & LLKHF_INJECTED:
+            return True
+        vk = data.vkCode
+        if msg in (WM_KEYUP, WM_SYSKEYUP):
+            if vk in self._swallowed:
+                self._swallowed.discard(vk)
+                self.listener.suppress_event()
+            return True
+        if msg not in (WM_KEYDOWN, WM_SYSKEYDOWN):
+            return True
+        if self.accept_digits:
+            key = keyboard.KeyCode.from_char(chr(vk)) if VK_1 <= vk < VK_1 + 9 else None
+        else:
+            key = _FKEYS[vk - VK_F1] if VK_F1 <= vk < VK_F1 + 9 else None
+        if key is None:
+            return True
+        with self.lock:
+            row = self.accept_row(key, getattr(key, 'char', None))
+            ctx = self.contexts.get(self.window() if self.window else None)
+            if row is None or not self.accept(ctx, row, key, True):
+                return True
+        self._swallowed.add(vk)
+        self.listener.suppress_event()
+
+    def accept(self, ctx, row, key, swallowed):
+        # replace the typed prefix with the chosen word plus a space
+        t = time.perf_counter()
+        word = self.suggestion(row)
+        if word is None:
+            return False
+        prefix = ctx.current
+        # a digit key that wasn't swallowed was typed into the application too
+        backspaces = 1 if key not in _FKEYS and not swallowed else 0
+        if normalize(prefix) == word[:len(prefix)]:
+            # keep what was typed, including its case
+            typed = prefix + word[len(prefix):]
+            text = word[len(prefix):] + ' '
+        else:
+            typed = word
+            backspaces += len(prefix)
+            text = word + ' '
+        try:
+            self._expected.extend(self.injector.send(backspaces, text))
+        except Exception as e:
+            print('Failed to type suggestion:', e)
+            return False
+        ctx.current = typed
+        self.commit_word(ctx)
+        self.accept_stats.add(time.perf_counter() - t, row, len(text))
+        self.callback(ctx.snapshot(), key)
+        return True
+
+    def commit_word(self, ctx):
+        # a separator follows a word: hand (prev, word) to the learner
+        done = ctx.separator()
+        if done and self.on_word is not None:
+            self.on_word(*done)
 
     def on_release(self, key):
-        pass
+        self._held.discard(key)
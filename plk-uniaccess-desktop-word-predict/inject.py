@@ -0,0 +1,165 @@
+# Typing text into the focused application on the user's behalf. An accepted
+# suggestion becomes one batch of synthetic key events (a few backspaces, then
+# the rest of the word): a single SendInput call on Windows, XTest requests
+# flushed once on X11, and pynput's per-character typing elsewhere.
+#
+# send(backspaces, text) returns the key presses the keyboard hook will see
+# for the batch, in order: 'backspace', 'shift' or a character.
+import sys
+from collections import deque
+
+class AcceptStats:
+    # acceptance telemetry: key press -> text injected, and what it saved
+    def __init__(self, keep=1000):
+        self.samples = deque(maxlen=keep)
+        self.accepted = 0
+        self.chars_injected = 0
+        self.by_row = {}  # 0-based popup row -> times picked
+
+    def add(self, seconds, row, chars):
+        self.samples.append(seconds)
+        self.accepted += 1
+        self.chars_injected += chars
+        self.by_row[row] = self.by_row.get(row, 0) + 1
+
+    def percentile(self, q):
+        s = sorted(self.samples)
+        return s[min(int(len(s) * q), len(s) - 1)] if s else 0.0
+
+    def summary(self):
+        return ('accepted %d suggestions (%d chars injected), latency p50 %.1f ms, p99 %.1f ms, rows %s'
+                % (self.accepted, self.chars_injected, self.percentile(0.5) * 1e3,
+                   self.percentile(0.99) * 1e3, dict(sorted(self.by_row.items()))))
+
+class PynputInjector:
+    # fallback: one synthetic event pair per character
+    def __init__(self):
+        from pynput.keyboard import Controller, Key
+        self.kb = Controller()
+        self.backspace = Key.backspace
+
+    def send(self, backspaces, text):
+        for _ in range(backspaces):
+            self.kb.press(self.backspace)
+            self.kb.release(self.backspace)
+        self.kb.type(text)
+        return ['backspace'] * backspaces + list(text)
+
+class SendInputInjector:
+    # Windows: every key event of the batch in one SendInput call
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self.ctypes = ctypes
+        ulong_ptr = ctypes.c_size_t
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                        ('time', wintypes.DWORD), ('dwExtraInfo', ulong_ptr)]
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                        ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ulong_ptr)]
+
+        class _U(ctypes.Union):
+            _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('u', _U)]
+
+        self.INPUT = INPUT
+        self.user32 = ctypes.windll.user32
+
+    def send(self, backspaces, text):
+        INPUT_KEYBOARD, KEYEVENTF_KEYUP, KEYEVENTF_UNICODE, VK_BACK = 1, 0x2, 0x4, 0x08
+        events = []
+        for _ in range(backspaces):
+            events.append((VK_BACK, 0, 0))
+            events.append((VK_BACK, 0, KEYEVENTF_KEYUP))
+        data = text.encode('utf-16-le')
+        for i in range(0, len(data), 2):  # surrogate pairs go as two units
+            unit = data[i] | (data[i + 1] << 8)
+            events.append((0, unit, KEYEVENTF_UNICODE))
+            events.append((0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+        batch = (self.INPUT * len(events))()
+        for inp, (vk, scan, flags) in zip(batch, events):
+            inp.type = INPUT_KEYBOARD
+            inp.u.ki.wVk = vk
+            inp.u.ki.wScan = scan
+            inp.u.ki.dwFlags = flags
+        if self.user32.SendInput(len(events), batch, self.ctypes.sizeof(self.INPUT)) != len(events):
+            raise OSError('SendInput was blocked')
+        return ['backspace'] * backspaces + list(text)
+
+class XTestInjector:
+    # X11: XTest key events queued for the whole batch, then one flush. Characters
+    # missing from the keymap are typed through a spare keycode, remapped per
+    # character (that part needs a round trip each).
+    def __init__(self, display_name=None):
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self.X, self.xtest = X, xtest
+        self.display = display.Display(display_name)
+        if not self.display.has_extension('XTEST'):
+            raise OSError('X server has no XTEST extension')
+        self.shift = self.display.keysym_to_keycode(XK.XK_Shift_L)
+        self.backspace = self.display.keysym_to_keycode(XK.XK_BackSpace)
+        first = self.display.display.info.min_keycode
+        count = self.display.display.info.max_keycode - first + 1
+        mapping = self.display.get_keyboard_mapping(first, count)
+        # a keycode with nothing bound, for characters the keymap lacks
+        self.spare = next((first + i for i, syms in enumerate(mapping) if not any(syms)), None)
+
+    def _keysym(self, ch):
+        c = ord(ch)
+        return c if c < 0x100 else 0x01000000 | c
+
+    def _tap(self, keycode, shifted=False):
+        fake = self.xtest.fake_input
+        if shifted:
+            fake(self.display, self.X.KeyPress, self.shift)
+        fake(self.display, self.X.KeyPress, keycode)
+        fake(self.display, self.X.KeyRelease, keycode)
+        if shifted:
+            fake(self.display, self.X.KeyRelease, self.shift)
+
+    def send(self, backspaces, text):
+        d = self.display
+        pressed = ['backspace'] * backspaces
+        for _ in range(backspaces):
+            self._tap(self.backspace)
+        for ch in text:
+            sym = self._keysym(ch)
+            code = d.keysym_to_keycode(sym)
+            if code:
+                shifted = d.keycode_to_keysym(code, 0) != sym
+                if shifted:
+                    pressed.append('shift')
+                self._tap(code, shifted)
+            elif self.spare is not None:
+                d.sync()  # earlier keys must land before the keymap changes
+                d.change_keyboard_mapping(self.spare, [(sym, sym)])
+                d.sync()
+                self._tap(self.spare)
+                d.sync()
+                d.change_keyboard_mapping(self.spare, [(0, 0)])
+            pressed.append(ch)
+        d.sync()
+        return pressed
+
+def default_injector():
+    # the best available backend for this session, or None
+    if sys.platform == 'win32':
+        try:
+            return SendInputInjector()
+        except Exception:
+            pass
+    elif sys.platform.startswith('linux'):
+        try:
+            return XTestInjector()
+        except Exception:
+            pass
+    try:
+        return PynputInjector()
+    except Exception:
+        return None
@@ -0,0 +1,272 @@
+# Higher-order n-gram engine with interpolated Kneser-Ney smoothing, built on the
+# integer-id storage of CompactModel.
+#
+# Raw n-gram counts (orders 3..N) are kept as sorted id rows. At the end of each
+# training call they are turned into per-order lookup tables: order n is one
+# sorted array of keys (index of the (n-1)-word context in table n-1) << 32 | word,
+# with the interpolated probability of each row and a backoff weight per context.
+# A query is one vectorized searchsorted per order over all candidates, so a
+# deeper context costs a few array lookups, not a Python loop per word.
+#
+# Tables are pruned top-down: rows seen fewer than min_count times, or whose
+# removal changes the model by less than prune_threshold (weighted log-ratio of
+# the explicit and backed-off probability, after Stolcke), are dropped unless a
+# kept higher-order row still needs them as its context or suffix. Backoff weights
+# are then recomputed bottom-up from the pruned model's own lower-order
+# probabilities, so every context stays a distribution. The raw counts of the
+# pruned rows (bigrams included) are dropped as well, so memory follows the
+# pruned model; training after a build continues from the surviving counts, and
+# a pruned n-gram seen again starts counting from zero.
+import heapq
+import numpy as np
+from compact_model import CompactModel
+from tokenizer import normalize
+
+_MASK = np.uint64(0xffffffff)
+_SHIFT = np.uint64(32)
+_FLUSH_ROWS = 1 << 21  # buffered n-gram occurrences per order before a merge
+_UNIFORM = 1e-6  # share of the unigram distribution spread over the vocabulary
+
+class KneserNeyModel(CompactModel):
+    def __init__(self, order=3, min_count=1, prune_threshold=0.0, top_n=200, tokenizer=None):
+        if order < 2:
+            raise ValueError('order must be at least 2')
+        super().__init__(top_n, tokenizer)
+        self.order = order
+        self.min_count = min_count
+        self.prune_threshold = prune_threshold
+        self._history = []  # last order-1 token ids, carried across batches
+        self._raw = {n: (np.zeros((0, n), np.int32), np.zeros(0, np.int64)) for n in range(3, order + 1)}
+        self._raw_pending = {n: [] for n in range(3, order + 1)}
+        self._raw_pending_len = 0
+        self._tables = None  # rebuilt at the end of each training call
+
+    # the tables are rebuilt on the training thread, so a query never pays for it
+    def train_from_text(self, text):
+        super().train_from_text(text)
+        self._build()
+
+    def train_from_file(self, filename, chunk_size=1 << 20, progress=None, workers=1):
+        # shards only carry unigram/bigram counts, so higher orders train serially
+        super().train_from_file(filename, chunk_size, progress, workers=1)
+        self._build()
+
+    def _train_tokens(self, tokens, prev=None):
+        if prev is None:
+            self._history = []
+        last = super()._train_tokens(tokens, prev)
+        if tokens:
+            ids = np.concatenate([np.array(self._history, np.int64),
+                                  np.fromiter((self.ids[t] for t in tokens), np.int64, len(tokens))])
+            for n in range(3, self.order + 1):
+                if len(ids) >= n:
+                    rows = np.lib.stride_tricks.sliding_window_view(ids, n).astype(np.int32)
+                    self._raw_pending[n].append(rows)
+                    self._raw_pending_len += len(rows)
+            self._history = ids[-(self.order - 1):].tolist()
+            if self._raw_pending_len >= _FLUSH_ROWS:
+                self._flush_raw()
+            self._tables = None
+        return last
+
+    def _flush_raw(self):
+        for n, pending in self._raw_pending.items():
+            if not pending:
+                continue
+            rows, counts = self._raw[n]
+            new_rows, new_counts = np.unique(np.concatenate(pending), axis=0, return_counts=True)
+            rows = np.concatenate([rows, new_rows])
+            counts = np.concatenate([counts, new_counts])
+            rows, inv = np.unique(rows, axis=0, return_inverse=True)
+            self._raw[n] = (rows, np.bincount(inv.ravel(), weights=counts, minlength=len(rows)).astype(np.int64))
+            pending.clear()
+        self._raw_pending_len = 0
+
+    # ---- building the smoothed tables ----
+
+    def _build(self):
+        self._flush()
+        self._flush_raw()
+        v = len(self.words)
+        N = self.order
+        rows = {2: np.stack([(self._keys >> _SHIFT).astype(np.int64),
+                             (self._keys & _MASK).astype(np.int64)], axis=1)}
+        raw = {2: self._counts.copy()}
+        for n in range(3, N + 1):
+            rows[n] = self._raw[n][0].astype(np.int64)
+            raw[n] = self._raw[n][1]
+        # hierarchical keys: index of the row's first n-1 words in table n-1, then the word
+        keys = {}
+        for n in range(2, N + 1):
+            ctx = _find(keys, rows[n][:, :-1])[0]
+            keys[n] = (ctx.astype(np.uint64) << _SHIFT) | rows[n][:, -1].astype(np.uint64)
+        # counts used for smoothing: raw at the top order, continuation counts below
+        vals = {N: raw[N].astype(np.float64)}
+        for n in range(2, N):
+            idx, _ = _find(keys, rows[n + 1][:, 1:])
+            vals[n] = np.bincount(idx, minlength=len(rows[n])).astype(np.float64)
+        cont1 = np.bincount(rows[2][:, 1], minlength=v).astype(np.float64)
+        p1 = (1 - _UNIFORM) * cont1 / max(cont1.sum(), 1) + _UNIFORM / max(v, 1)
+
+        probs, lowers, ctxs, suffixes = {}, {}, {}, {}
+        lower_p = p1
+        for n in range(2, N + 1):
+            ctx = (keys[n] >> _SHIFT).astype(np.int64)
+            nctx = v if n == 2 else len(rows[n - 1])
+            val = vals[n]
+            denom = np.bincount(ctx, weights=val, minlength=nctx)
+            types = np.bincount(ctx, weights=(val > 0), minlength=nctx)
+            d = _discount(val)
+            suffix = _find(keys, rows[n][:, 1:])[0]
+            lower = lower_p[suffix]
+            dn = denom[ctx]
+            safe = np.where(dn > 0, dn, 1)
+            gamma = d * types[ctx] / safe
+            prob = np.where(dn > 0, np.maximum(val - d, 0) / safe + gamma * lower, lower)
+            probs[n], lowers[n], ctxs[n], suffixes[n] = prob, lower, ctx, suffix
+            lower_p = prob
+
+        # prune top-down; rows needed as context or suffix of a kept row survive
+        keep = {}
+        total = {n: max(raw[n].sum(), 1) for n in raw}
+        protect = None
+        for n in range(N, 1, -1):
+            drop = raw[n] < self.min_count
+            if self.prune_threshold > 0:
+                ctx = ctxs[n]
+                nctx = v if n == 2 else len(rows[n - 1])
+                gamma = _gamma(ctx, probs[n], lowers[n], np.ones(len(ctx), bool), nctx)
+                backed_off = np.maximum(gamma[ctx] * lowers[n], 1e-300)
+                delta = raw[n] / total[n] * np.log(probs[n] / backed_off)
+                drop |= delta < self.prune_threshold
+            if protect is not None:
+                drop &= ~protect
+            keep[n] = ~drop
+            if n > 2:
+                protect = np.zeros(len(rows[n - 1]), bool)
+                protect[ctxs[n][keep[n]]] = True
+                protect[suffixes[n][keep[n]]] = True
+
+        # compact bottom-up, remapping context indexes to the surviving rows.
+        # lower_p is what the pruned model answers for each row of the order below
+        # (its stored probability, or the backed-off one if the row was dropped)
+        tables = {}
+        remap = None
+        lower_p = p1
+        for n in range(2, N + 1):
+            k = keep[n]
+            ctx = ctxs[n][k]
+            if remap is not None:
+                ctx = remap[ctx]
+            prob = probs[n].astype(np.float32)
+            lower = lower_p[suffixes[n]]
+            gamma = _gamma(ctxs[n], prob, lower, k, v if n == 2 else len(rows[n - 1]))
+            lower_p = np.where(k, prob, gamma[ctxs[n]] * lower)
+            if n > 2:
+                gamma = gamma[keep[n - 1]]
+            tkeys = (ctx.astype(np.uint64) << _SHIFT) | (keys[n][k] & _MASK)
+            tables[n] = (tkeys, prob[k], gamma)
+            remap = np.cumsum(k) - 1
+        self._p1 = p1
+        self._tables = tables
+        # raw rows are in table order, so keep[n] selects the survivors
+        self._keys, self._counts = self._keys[keep[2]], self._counts[keep[2]]
+        for n in range(3, N + 1):
+            rows, counts = self._raw[n]
+            self._raw[n] = (rows[keep[n]], counts[keep[n]])
+
+    def nbytes(self):
+        # count arrays, raw higher-order rows and the query tables
+        raw = sum(r.nbytes + c.nbytes for r, c in self._raw.values())
+        raw += sum(a.nbytes for pending in self._raw_pending.values() for a in pending)
+        tables = sum(a.nbytes for t in (self._tables or {}).values() for a in t)
+        return super().nbytes() + raw + tables
+
+    def ngram_count(self):
+        # rows kept in the smoothed tables, per order
+        if self._tables is None:
+            self._build()
+        return {n: len(t[0]) for n, t in self._tables.items()}
+
+    # ---- queries ----
+
+    def _context_index(self, n, h):
+        # row of context h (n-1 word ids) in table n-1, i.e. the key prefix for order n
+        idx = h[0]
+        for m in range(2, n):
+            tkeys = self._tables[m][0]
+            key = (np.uint64(idx) << _SHIFT) | np.uint64(h[m - 1])
+            i = int(np.searchsorted(tkeys, key))
+            if i == len(tkeys) or tkeys[i] != key:
+                return None
+            idx = i
+        return idx
+
+    def kn_probs(self, cand_ids, context):
+        # P_KN(w | context) for an array of word ids; context is a list of word ids
+        if self._tables is None:
+            self._build()
+        p = self._p1[cand_ids]
+        for n in range(2, self.order + 1):
+            if len(context) < n - 1:
+                break
+            ci = self._context_index(n, context[-(n - 1):])
+            if ci is None:
+                break
+            tkeys, tprob, gamma = self._tables[n]
+            backed_off = gamma[ci] * p
+            if not len(tkeys):
+                p = backed_off
+                continue
+            want = (np.uint64(ci) << _SHIFT) | cand_ids.astype(np.uint64)
+            pos = np.minimum(np.searchsorted(tkeys, want), len(tkeys) - 1)
+            p = np.where(tkeys[pos] == want, tprob[pos], backed_off)
+        return p
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        # context: earlier words, oldest first; defaults to [prev_word]
+        prefix = normalize(prefix)
+        if prefix == "": return []
+        candidates = self._prefix_candidates(prefix)
+        if not candidates:
+            return []
+        if context is None:
+            context = [prev_word] if prev_word else []
+        hist = []
+        for w in context[-(self.order - 1):]:
+            i = self.ids.get(normalize(w))
+            # an unknown word cuts the usable context
+            hist = [] if i is None else hist + [i]
+        cand = np.fromiter((self.ids[w] for w in candidates), np.int64, len(candidates))
+        uni = self._uni[cand] / (self.total_unigrams + 1)
+        score = (1 - lambda_context) * uni + lambda_context * self.kn_probs(cand, hist)
+        return heapq.nlargest(k, zip(score.tolist(), candidates))
+
+def _find(keys, rows):
+    # row index of each id row (m x n) in table n, given the tables' sorted keys;
+    # returns (index, found)
+    n = rows.shape[1]
+    if n == 1:
+        return rows[:, 0], np.ones(len(rows), bool)
+    prefix, ok = _find(keys, rows[:, :-1])
+    want = (prefix.astype(np.uint64) << _SHIFT) | rows[:, -1].astype(np.uint64)
+    tk = keys[n]
+    if not len(tk):
+        return np.zeros(len(rows), np.int64), np.zeros(len(rows), bool)
+    pos = np.minimum(np.searchsorted(tk, want), len(tk) - 1)
+    return pos, ok & (tk[pos] == want)
+
+def _discount(val):
+    # D = n1 / (n1 + 2 n2) from the count-of-counts of this order
+    n1 = np.count_nonzero(val == 1)
+    n2 = np.count_nonzero(val == 2)
+    if n1 == 0 or n2 == 0:
+        return 0.75
+    return min(max(n1 / (n1 + 2.0 * n2), 0.1), 0.95)
+
+def _gamma(ctx, prob, lower, keep, nctx):
+    # backoff weight per context so the kept explicit rows plus the backed-off
+    # remainder sum to one: (1 - sum kept prob) / (1 - sum kept lower-order prob)
+    num = 1 - np.bincount(ctx[keep], weights=prob[keep], minlength=nctx)
+    den = 1 - np.bincount(ctx[keep], weights=lower[keep], minlength=nctx)
+    return np.where(den > 1e-12, np.maximum(num, 0) / np.maximum(den, 1e-12), 1.0)
@@ -1,8 +1,15 @@
-import sys, os, threading, time
+import sys, os, re, threading, time, multiprocessing
 from PyQt5 import QtWidgets, QtGui, QtCore
 from prediction import PredictionModel
+from model_file import load_model
+from adaptive import UserModel, MixedModel
+from cache import CachedPredictor
+from fuzzy import FuzzyPredictor
+from tokenizer import grapheme_len
 from popup import SuggestionPopup
 from hooks import KeyHook
+from inject import default_injector
+from worker import PredictionWorker, ModelBuilder
 from settings_dialog import SettingsDialog
 from config import Config
 import platform
@@ -27,18 +34,44 @@ class TrayApp(QtWidgets.QSystemTrayIcon):
         super().__init__(icon)
         self.model = model
         self.config = config
+        # learn from what the user types; blended with the corpus model
+        s = self.config.load()
+        self.user_model = None
+        self.predictor = model
+        if s.get('learn_from_typing', True):
+            self.user_model = UserModel(user_model_path(s), half_life_days=s.get('user_half_life_days', 14.0))
+            self.user_model.start()
+            QtWidgets.qApp.aboutToQuit.connect(self.user_model.close)
+            self.predictor = MixedModel(model, self.user_model, s.get('user_weight', 0.3))
+        # repeated and narrowing queries are answered from here
+        self.cache = CachedPredictor(self.predictor, s.get('cache_size', 512))
+        # tolerate a wrong, missing, extra or swapped letter in the prefix
+        self.fuzzy = FuzzyPredictor(self.cache, s.get('fuzzy_edits', 1))
         self.setToolTip('WordQ-like Predictor')
         menu = QtWidgets.QMenu()
         settings_action = menu.addAction('Settings')
         settings_action.triggered.connect(self.open_settings)
+        # shown while a corpus is being trained in the background
+        self.cancel_action = menu.addAction('Cancel corpus loading')
+        self.cancel_action.triggered.connect(self.cancel_build)
+        self.cancel_action.setVisible(False)
+        self.builder = None
         quit_action = menu.addAction('Quit')
         quit_action.triggered.connect(QtWidgets.qApp.quit)
         self.setContextMenu(menu)
         self.activated.connect(self.on_activated)
         self.popup = SuggestionPopup()
         self.settings_dialog = SettingsDialog(self.config)
+        # predictions run on one worker thread; results come back as a signal
+        self.worker = PredictionWorker(self.predict_for)
+        self.worker.ready.connect(self.on_prediction)
+        self.worker.start()
+        QtWidgets.qApp.aboutToQuit.connect(self.stop_worker)
         # start key hook
-        self.keyhook = KeyHook(self.on_key_event)
+        self.keyhook = KeyHook(self.on_key_event, on_word=self.learn_word if self.user_model else None,
+                               window=getattr(caret, 'active_window', None),
+                               suggestion=self.popup.word_at, injector=default_injector(),
+                               accept_keys=s.get('accept_keys', 'function'))
         self.keyhook.start()
 
     def on_activated(self, reason):
@@ -52,42 +85,220 @@ class TrayApp(QtWidgets.QSystemTrayIcon):
             s = self.config.load()
             corpus = s.get('corpus','').strip()
             if corpus and os.path.exists(corpus):
-                self.model.train_from_file(corpus)
+                self.start_build(s, corpus)
+
+    def start_build(self, settings, corpus):
+        # build a fresh model from the corpus off the GUI thread and keep it for the
+        # next launch; the current model serves suggestions until it is swapped in
+        self.cancel_build()
+        path = fresh_model_path(settings) if saves_model(settings) else None
+        builder = ModelBuilder(lambda: new_model(settings), corpus, path,
+                               workers=os.cpu_count() or 1)
+        builder.progress.connect(lambda percent: self.on_build_progress(builder, percent))
+        builder.save_failed.connect(lambda error: self.on_save_failed(builder, error))
+        builder.built.connect(lambda model: self.on_build_done(builder, model))
+        builder.failed.connect(lambda error: self.on_build_done(builder, None, error))
+        builder.cancelled.connect(lambda: self.on_build_done(builder, None))
+        self.builder = builder
+        self.cancel_action.setVisible(True)
+        self.setToolTip('WordQ-like Predictor - loading corpus...')
+        builder.start()
+
+    def cancel_build(self):
+        if self.builder is not None:
+            self.builder.cancel()
+            self.builder = None
+            self.cancel_action.setVisible(False)
+            self.setToolTip('WordQ-like Predictor')
+
+    def on_build_progress(self, builder, percent):
+        if builder is self.builder:
+            self.setToolTip('WordQ-like Predictor - loading corpus: %d%%' % percent)
+
+    def on_save_failed(self, builder, error):
+        # GUI thread; arrives just before built
+        if builder is self.builder:
+            self.showMessage('WordQ-like Predictor',
+                             'The corpus model could not be saved and will be lost on exit: %s' % error,
+                             QtWidgets.QSystemTrayIcon.Warning)
+
+    def on_build_done(self, builder, model, error=None):
+        # GUI thread; results of a cancelled or superseded build are dropped
+        if builder is not self.builder:
+            return
+        self.builder = None
+        self.cancel_action.setVisible(False)
+        self.setToolTip('WordQ-like Predictor')
+        if model is not None:
+            self.set_model(model)
+            if builder.saved:
+                self.record_model_file(builder.path)
+            self.showMessage('WordQ-like Predictor', 'Corpus loaded.')
+        elif error is not None:
+            self.showMessage('WordQ-like Predictor', 'Failed to load corpus: %s' % error,
+                             QtWidgets.QSystemTrayIcon.Warning)
+
+    def record_model_file(self, path):
+        # load the new file next launch; the old one goes now, or at the next
+        # launch if it is still mapped (Windows won't delete a mapped file)
+        s = dict(self.config.load())
+        old = saved_model_path(s)
+        s['model_file'] = path
+        self.config.save(s)
+        if old != path:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+
+    def set_model(self, model):
+        # one attribute store: predictions already running finish on the old model
+        self.model = model
+        if isinstance(self.predictor, MixedModel):
+            self.predictor.base = model
+        else:
+            self.predictor = self.cache.model = model
+
+    def learn_word(self, prev, word):
+        # keyboard hook thread: words typed into password fields are never learned or logged
+        if caret and hasattr(caret, 'secure_field') and caret.secure_field():
+            return
+        self.user_model.observe(prev, word)
 
     def show_suggestions_at(self, suggestions, pos):
         if not suggestions:
-            self.popup.hide()
+            self.hide_popup()
             return
         # Qt expects QPoint; pos is (x,y)
         p = QtCore.QPoint(pos[0], pos[1])
         self.popup.show_suggestions(suggestions, p)
+        self.keyhook.show_rows(len(self.popup.shown))
+
+    def hide_popup(self):
+        self.popup.hide_suggestions()
+        self.keyhook.show_rows(0)
 
-    def on_key_event(self, text_buffer, key):
-        # simple: get current word prefix (after last whitespace)
-        prefix = text_buffer.rstrip().split(' ')[-1] if text_buffer else ''
+    def on_key_event(self, context, key):
+        # keyboard hook thread: hand the typing context to the worker and return
+        self.worker.submit(context)
+
+    def predict_for(self, context):
+        # worker thread: (suggestions, caret pos) for (prefix, earlier words), or None to hide
+        prefix, words = context
         s = self.config.load()
         min_pref = s.get('min_prefix', 1)
         num = s.get('num_suggestions', 6)
         bw = s.get('bigram_weight', 0.7)
-        if len(prefix) >= min_pref:
-            # determine prev word
-            parts = text_buffer.rstrip().split()
-            prev = parts[-2] if len(parts) >= 2 else None
-            suggestions = self.model.predict(prefix, prev_word=prev, k=num, lambda_context=bw)
-            # get caret pos
-            pos = None
-            if caret and hasattr(caret, 'get_caret_position'):
-                pos = caret.get_caret_position()
-            if pos:
-                # adjust a little downwards
-                self.show_suggestions_at(suggestions, (pos[0], pos[1]+5))
-            else:
-                # no caret info: hide popup
-                self.popup.hide()
-        else:
-            self.popup.hide()
+        if grapheme_len(prefix) < min_pref:
+            return None
+        prev = words[-1] if words else None
+        suggestions = self.fuzzy.predict(prefix, prev_word=prev, k=num, lambda_context=bw,
+                                         context=list(words[-3:]))
+        # get caret pos
+        pos = None
+        if caret and hasattr(caret, 'get_caret_position'):
+            pos = caret.get_caret_position()
+        if not pos:
+            # no caret info: hide popup
+            return None
+        # adjust a little downwards
+        return suggestions, (pos[0], pos[1] + 5)
+
+    def on_prediction(self, result, seq, pressed_at):
+        # GUI thread
+        if not self.worker.is_current(seq):
+            self.worker.stats.stale += 1
+            return
+        if result is None:
+            self.hide_popup()
+            return
+        self.show_suggestions_at(*result)
+        if result[0]:
+            self.worker.stats.add(time.perf_counter() - pressed_at)
+
+    def stop_worker(self):
+        self.cancel_build()
+        self.keyhook.stop()
+        self.worker.stop()
+        if self.config.load().get('debug', False):
+            print(self.worker.stats.summary())
+            print(self.keyhook.accept_stats.summary())
+
+def new_model(settings):
+    # 'engine' picks the storage/smoothing used when training from a corpus
+    engine = settings.get('engine', 'dict')
+    if engine == 'compact':
+        from compact_model import CompactModel
+        return CompactModel()
+    if engine == 'kneser_ney':
+        from kneser_ney import KneserNeyModel
+        return KneserNeyModel(order=settings.get('ngram_order', 3),
+                              min_count=settings.get('ngram_min_count', 2),
+                              prune_threshold=settings.get('ngram_prune', 1e-9))
+    return PredictionModel()
+
+def saves_model(settings):
+    # the model file holds bigram models; Kneser-Ney tables are rebuilt on each launch
+    return settings.get('engine', 'dict') != 'kneser_ney'
+
+def model_path(settings):
+    return settings.get('model_path') or os.path.join(os.path.expanduser('~'), '.wordq_model.bin')
+
+# Each build is saved under a fresh name beside model_path and recorded as
+# model_file: the served model keeps its file mapped, and Windows refuses to
+# replace a mapped file.
+def fresh_model_path(settings):
+    root, ext = os.path.splitext(model_path(settings))
+    return '%s-%d%s' % (root, time.time_ns(), ext)
+
+def _is_build_of(path, settings):
+    root, ext = os.path.splitext(os.path.abspath(model_path(settings)))
+    return re.fullmatch(re.escape(root) + r'-\d+' + re.escape(ext), os.path.abspath(path)) is not None
+
+def saved_model_path(settings):
+    # the newest build, or model_path itself (files saved by older versions)
+    saved = settings.get('model_file')
+    if saved and _is_build_of(saved, settings) and os.path.exists(saved):
+        return saved
+    return model_path(settings)
+
+def remove_stale_models(settings):
+    # builds superseded while they were still mapped; nothing is mapped yet at startup
+    root, ext = os.path.splitext(model_path(settings))
+    directory = os.path.dirname(os.path.abspath(root))
+    current = os.path.abspath(saved_model_path(settings))
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        # model_path itself too, once a build has superseded it
+        if path != current and (_is_build_of(path, settings) or path == os.path.abspath(root + ext)):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+def user_model_path(settings):
+    return settings.get('user_model_path') or os.path.join(os.path.expanduser('~'), '.wordq_user.log')
+
+def load_saved_model(settings):
+    # the saved model maps in milliseconds; fall back to a small demo model. A file
+    # saved by a bigram engine is not a stand-in for the configured Kneser-Ney model
+    path = saved_model_path(settings)
+    if saves_model(settings) and os.path.exists(path):
+        try:
+            return load_model(path)
+        except (OSError, ValueError) as e:
+            print('Failed to load model:', e)
+    model = PredictionModel()
+    # small demo training; user should load corpus from settings
+    model.train_from_text('This is a demo corpus. The quick brown fox jumps over the lazy dog.')
+    return model
 
 def main():
+    multiprocessing.freeze_support()  # corpus training workers in frozen builds
     app = QtWidgets.QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
     # tray icon
@@ -96,11 +307,14 @@ def main():
         # fallback to built-in
         icon = app.style().standardIcon(QtWidgets.QStyle.SP_FileDialogInfoView)
     cfg = Config()
-    model = PredictionModel()
-    # small demo training; user should load corpus from settings
-    model.train_from_text('This is a demo corpus. The quick brown fox jumps over the lazy dog.')
+    s = cfg.load()
+    remove_stale_models(s)
+    model = load_saved_model(s)
     tray = TrayApp(icon, model, cfg)
     tray.show()
+    corpus = s.get('corpus', '').strip()
+    if not saves_model(s) and corpus and os.path.exists(corpus):
+        tray.start_build(s, corpus)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
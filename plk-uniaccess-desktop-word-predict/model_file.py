@@ -0,0 +1,241 @@
+# Compact binary model file. Words are sorted and numbered (id = rank), bigrams
+# are stored as CSR rows of (next id, count) and the prefix trie is flattened into
+# arrays. Loading maps the file read-only and reads the arrays in place, so
+# startup does no parsing and several processes share the same pages.
+#
+# Layout: header | section table | crc32 | sections (8-byte aligned). Sections
+# hold little-endian arrays; the crc covers every byte of the file except itself.
+import os, mmap, struct, sys, zlib, tempfile
+from array import array
+from bisect import bisect_left
+from prediction import top_k
+from tokenizer import normalize
+
+MAGIC = b'WQPM'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHIQ')  # magic, version, section count, vocab size, total unigrams
+_SECTION = struct.Struct('<QQ')  # byte offset, byte length
+_CRC = struct.Struct('<I')
+
+_SECTIONS = (
+    ('word_offsets', 'Q'),  # vocab+1 byte offsets into words
+    ('words', 'B'),  # utf-8 words in sorted order, concatenated
+    ('unigrams', 'Q'),  # count per word id
+    ('row_ptr', 'Q'),  # vocab+1 starts of each word's bigram row in cols/counts
+    ('cols', 'I'),  # next word ids, sorted within a row
+    ('counts', 'I'),
+    ('row_totals', 'Q'),  # sum of counts per row
+    ('node_edges', 'I'),  # trie nodes+1 starts into edge_chars/edge_nodes
+    ('edge_chars', 'I'),  # code points, sorted within a node
+    ('edge_nodes', 'I'),
+    ('node_tops', 'I'),  # trie nodes+1 starts into top_ids
+    ('top_ids', 'I'),  # per-node completions, best first
+)
+
+def save_model(model, path):
+    # write a PredictionModel (or CompactModel); the file is replaced atomically so
+    # processes that still map the old file keep a consistent view
+    if getattr(model, 'order', 2) > 2:
+        raise ValueError('the model file stores unigram/bigram models only')
+    words = sorted(model.vocab)
+    ids = {w: i for i, w in enumerate(words)}
+    data = {name: array(code) for name, code in _SECTIONS}
+    blob = bytearray()
+    offsets = data['word_offsets']
+    offsets.append(0)
+    for w in words:
+        blob += w.encode('utf-8')
+        offsets.append(len(blob))
+    data['words'] = array('B', bytes(blob))
+    data['unigrams'].extend(model.unigrams[w] for w in words)
+    row_ptr, cols, counts = data['row_ptr'], data['cols'], data['counts']
+    row_ptr.append(0)
+    for w in words:
+        row = model.bigram_row(w)
+        if row:
+            for j, c in sorted((ids[n], c) for n, c in row.items()):
+                cols.append(j)
+                counts.append(c)
+        row_ptr.append(len(cols))
+    data['row_totals'].extend(model.bigram_totals[w] for w in words)
+    # flatten the trie breadth-first; node i's children get consecutive numbers
+    node_edges, edge_chars, edge_nodes = data['node_edges'], data['edge_chars'], data['edge_nodes']
+    node_tops, top_ids = data['node_tops'], data['top_ids']
+    queue = [model.index.root]
+    for node in queue:
+        node_edges.append(len(edge_chars))
+        node_tops.append(len(top_ids))
+        top_ids.extend(ids[w] for w in node.top)
+        for ch in sorted(node.children):
+            edge_chars.append(ord(ch))
+            edge_nodes.append(len(queue))
+            queue.append(node.children[ch])
+    node_edges.append(len(edge_chars))
+    node_tops.append(len(top_ids))
+
+    head = _HEADER.pack(MAGIC, VERSION, len(_SECTIONS), len(words), model.total_unigrams)
+    table = b''
+    pos = _align(len(head) + _SECTION.size * len(_SECTIONS) + _CRC.size)
+    for name, _ in _SECTIONS:
+        size = len(data[name]) * data[name].itemsize
+        table += _SECTION.pack(pos, size)
+        pos = _align(pos + size)
+    crc = zlib.crc32(head + table)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(head + table + _CRC.pack(0))
+            for name, _ in _SECTIONS:
+                arr = data[name]
+                if sys.byteorder == 'big':
+                    arr.byteswap()
+                pad = b'\0' * (_align(f.tell()) - f.tell())
+                f.write(pad)
+                f.write(arr)
+                crc = zlib.crc32(arr, zlib.crc32(pad, crc))
+            f.seek(len(head) + len(table))
+            f.write(_CRC.pack(crc))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def _align(n):
+    return (n + 7) & ~7
+
+def load_model(path, verify=True):
+    return MappedModel(path, verify)
+
+class MappedModel:
+    # read-only model served straight from a mapped model file; same predict() API
+    # as PredictionModel, with word ids in place of strings internally
+    version = 0  # read-only, never changes
+
+    def __init__(self, path, verify=True):
+        if sys.byteorder != 'little':
+            raise ValueError('mapped models need a little-endian host')
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        try:
+            magic, version, nsec, self.vocab_size, self.total_unigrams = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError('%s is not a model file' % path)
+            if version != VERSION or nsec != len(_SECTIONS):
+                raise ValueError('unsupported model file version %d' % version)
+            view = self._view = memoryview(mm)
+            crc_pos = _HEADER.size + _SECTION.size * nsec
+            if verify:
+                (crc,) = _CRC.unpack_from(mm, crc_pos)
+                actual = zlib.crc32(view[crc_pos + _CRC.size:], zlib.crc32(view[:crc_pos]))
+                if crc != actual:
+                    raise ValueError('model file %s is corrupt (checksum mismatch)' % path)
+            for i, (name, code) in enumerate(_SECTIONS):
+                off, size = _SECTION.unpack_from(mm, _HEADER.size + _SECTION.size * i)
+                if off + size > len(mm):
+                    raise ValueError('model file %s is truncated' % path)
+                setattr(self, '_' + name, view[off:off + size].cast(code))
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for name, _ in _SECTIONS:
+            v = self.__dict__.pop('_' + name, None)
+            if v is not None:
+                v.release()
+        view = self.__dict__.pop('_view', None)
+        if view is not None:
+            view.release()
+        self._mm.close()
+
+    def _word(self, i):
+        o = self._word_offsets
+        return str(self._words[o[i]:o[i + 1]], 'utf-8')
+
+    def _word_bytes(self, i):
+        o = self._word_offsets
+        return bytes(self._words[o[i]:o[i + 1]])
+
+    def word_id(self, word):
+        # binary search over the sorted vocabulary (bisect's key= needs Python 3.10)
+        b = word.encode('utf-8')
+        lo, hi = 0, self.vocab_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_bytes(mid) < b:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.vocab_size and self._word_bytes(lo) == b:
+            return lo
+        return None
+
+    def _prefix_ids(self, prefix, max_candidates=200):
+        node = 0
+        ne, chars = self._node_edges, self._edge_chars
+        for ch in prefix:
+            lo, hi = ne[node], ne[node + 1]
+            j = bisect_left(chars, ord(ch), lo, hi)
+            if j == hi or chars[j] != ord(ch):
+                return []
+            node = self._edge_nodes[j]
+        nt = self._node_tops
+        start = nt[node]
+        return self._top_ids[start:min(nt[node + 1], start + max_candidates)].tolist()
+
+    def _child(self, node, ch):
+        # child of a flattened trie node along ch, or None
+        lo, hi = self._node_edges[node], self._node_edges[node + 1]
+        j = bisect_left(self._edge_chars, ord(ch), lo, hi)
+        if j == hi or self._edge_chars[j] != ord(ch):
+            return None
+        return self._edge_nodes[j]
+
+    def _children(self, node):
+        # (char, child node) pairs of a flattened trie node
+        lo, hi = self._node_edges[node], self._node_edges[node + 1]
+        return zip(map(chr, self._edge_chars[lo:hi]), self._edge_nodes[lo:hi])
+
+    def _prefix_candidates(self, prefix, max_candidates=200):
+        return [self._word(i) for i in self._prefix_ids(normalize(prefix), max_candidates)]
+
+    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        return [w for _, w in self.predict_scored(prefix, prev_word, k, lambda_context, context)]
+
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        prefix = normalize(prefix)
+        if prefix == "": return []
+        candidates = self._prefix_ids(prefix)
+        row = None
+        row_total = 0
+        p = self.word_id(normalize(prev_word)) if prev_word else None
+        if p is not None:
+            a, b = self._row_ptr[p], self._row_ptr[p + 1]
+            if b > a:
+                row = _Row(self._cols[a:b], self._counts[a:b])
+                row_total = self._row_totals[p]
+        scored = top_k(candidates, self._unigrams.__getitem__, self.total_unigrams,
+                       row, row_total, k, lambda_context)
+        return [(score, self._word(i)) for score, i in scored]
+
+class _Row:
+    # one CSR bigram row viewed as a mapping of next id -> count
+    __slots__ = ('cols', 'counts')
+
+    def __init__(self, cols, counts):
+        self.cols = cols
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.cols)
+
+    def get(self, j, default=None):
+        i = bisect_left(self.cols, j)
+        if i < len(self.cols) and self.cols[i] == j:
+            return self.counts[i]
+        return default
+
+    def items(self):
+        return zip(self.cols, self.counts)
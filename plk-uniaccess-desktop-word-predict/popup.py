@@ -1,7 +1,11 @@
 from PyQt5 import QtWidgets, QtCore, QtGui
 import re
 
+MAX_ROWS = 15  # the settings dialog allows up to 15 suggestions
+
 class SuggestionPopup(QtWidgets.QListWidget):
+    # rows are created once and reused; a keystroke only rewrites the rows whose
+    # word changed, and the window is moved/shown only when that changes too
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowFlags(
@@ -15,21 +19,50 @@ class SuggestionPopup(QtWidgets.QListWidget):
         self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
         self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
         self.setMaximumHeight(250)
+        self.setUniformItemSizes(True)
+        for i in range(MAX_ROWS):
+            self.addItem(QtWidgets.QListWidgetItem())
+            self.setRowHidden(i, True)
+        self._words = []  # words in the rows, in row order
+        self.shown = ()  # the same while the popup is up; read by the key hook thread
+        self._pos = None
+        self.ensurePolished()
 
     def show_suggestions(self, suggestions, pos_point):
-        self.clear()
-        for i, s in enumerate(suggestions, 1):
-            item = QtWidgets.QListWidgetItem(f"{i}. {s}")
-            self.addItem(item)
-        if suggestions:
+        if not suggestions:
+            self.hide_suggestions()
+            return
+        words = list(suggestions[:MAX_ROWS])
+        if words != self._words:
+            self.setUpdatesEnabled(False)
+            for i, w in enumerate(words):
+                if i >= len(self._words) or self._words[i] != w:
+                    self.item(i).setText(f"{i + 1}. {w}")
+                if i >= len(self._words):
+                    self.setRowHidden(i, False)
+            for i in range(len(words), len(self._words)):
+                self.setRowHidden(i, True)
+            self._words = words
             self.setCurrentRow(0)
+            self.setUpdatesEnabled(True)
+        if pos_point != self._pos:
             self.move(pos_point)
+            self._pos = QtCore.QPoint(pos_point)
+        if not self.isVisible():
             self.show()
-        else:
-            self.hide()
+        self.shown = tuple(words)
+
+    def hide_suggestions(self):
+        self.shown = ()
+        self.hide()
 
     def accept_current(self):
         row = self.currentRow()
-        if row >= 0:
-            return self.item(row).text().split('. ',1)[1]
+        if 0 <= row < len(self._words):
+            return self._words[row]
         return None
+
+    def word_at(self, row):
+        # any thread: the word shown in row (0-based), or None when the popup is down
+        shown = self.shown
+        return shown[row] if 0 <= row < len(shown) else None
@@ -1,50 +1,238 @@
-import re
+import re, heapq, os, codecs, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from collections import Counter, defaultdict
+from prefix_index import PrefixTrie
+from tokenizer import DEFAULT as DEFAULT_TOKENIZER, normalize
 
-WORD_RE = re.compile(r"[a-zA-Z']+")
+_SPACE_RE = re.compile(rb"\s")
+
+def _token_batches(f, start, end, chunk_size, tokenizer=DEFAULT_TOKENIZER):
+    # yield the tokens of bytes [start, end) of f one chunk at a time, carrying
+    # a token cut by a chunk boundary into the next batch
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    tail = ''
+    f.seek(start)
+    pos = start
+    while True:
+        raw = f.read(min(chunk_size, end - pos))
+        pos += len(raw)
+        text = tail + decoder.decode(raw, final=not raw)
+        if raw:
+            text, tail = tokenizer.split_tail(text)
+        yield tokenizer.tokenize(text), pos - start
+        if not raw:
+            break
+
+def _shard_ranges(filename, n):
+    # cut the file into n byte ranges whose edges sit just after a whitespace byte;
+    # whitespace never occurs inside a token or a UTF-8 sequence
+    size = os.path.getsize(filename)
+    edges = [0]
+    with open(filename, 'rb') as f:
+        for i in range(1, n):
+            pos = max(size * i // n, edges[-1])
+            f.seek(pos)
+            while pos < size:
+                block = f.read(4096)
+                if not block:
+                    break
+                m = _SPACE_RE.search(block)
+                if m:
+                    pos += m.end()
+                    break
+                pos += len(block)
+            edges.append(min(pos, size))
+    edges.append(size)
+    return [(a, b) for a, b in zip(edges, edges[1:]) if b > a]
+
+_stop = None  # in a worker process: an Event the parent sets to cancel training
+
+def _init_shard_worker(stop):
+    global _stop
+    _stop = stop
+
+def _count_shard(filename, start, end, chunk_size, tokenizer=DEFAULT_TOKENIZER):
+    # runs in a worker process: count one byte range and report its first and last
+    # token so the bigram across the shard boundary can be added when merging.
+    # Returns None if training was cancelled (checked once per chunk).
+    unigrams = Counter()
+    bigrams = defaultdict(Counter)
+    first = prev = None
+    with open(filename, 'rb') as f:
+        for tokens, _ in _token_batches(f, start, end, chunk_size, tokenizer):
+            if _stop is not None and _stop.is_set():
+                return None
+            if not tokens:
+                continue
+            if first is None:
+                first = tokens[0]
+            else:
+                bigrams[prev][tokens[0]] += 1
+            unigrams.update(tokens)
+            for a, b in zip(tokens, tokens[1:]):
+                bigrams[a][b] += 1
+            prev = tokens[-1]
+    return unigrams, dict(bigrams), first, prev
 
 class PredictionModel:
-    def __init__(self):
+    def __init__(self, top_n=200, tokenizer=None):
+        self.tokenizer = tokenizer or DEFAULT_TOKENIZER
         self.unigrams = Counter()
         self.bigrams = defaultdict(Counter)
+        self.bigram_totals = Counter()  # prev -> sum(self.bigrams[prev].values())
         self.vocab = set()
         self.total_unigrams = 0
+        self.version = 0  # bumped whenever counts change; caches compare it
+        # prefix -> top_n most frequent completions, maintained as we train
+        self.index = PrefixTrie(self.unigrams, top_n)
 
     def train_from_text(self, text):
-        text = text.lower()
-        tokens = WORD_RE.findall(text)
-        prev = None
+        self._train_tokens(self.tokenizer.tokenize(text))
+
+    def _train_tokens(self, tokens, prev=None):
+        # prev carries the last word of the previous batch so bigrams span batches
         for t in tokens:
             self.unigrams[t] += 1
             self.total_unigrams += 1
             self.vocab.add(t)
             if prev is not None:
                 self.bigrams[prev][t] += 1
+                self.bigram_totals[prev] += 1
             prev = t
+        # one index update per distinct word in this batch
+        self.index.update(set(tokens))
+        self.version += 1
+        return prev
 
-    def train_from_file(self, filename):
-        with open(filename, 'r', encoding='utf-8') as f:
-            self.train_from_text(f.read())
+    def train_from_file(self, filename, chunk_size=1 << 20, progress=None, workers=1):
+        # stream the corpus in fixed-size chunks so memory follows the model, not
+        # the file. progress(bytes_done, bytes_total) is called as work completes
+        # and may raise to stop training.
+        # With workers > 1 large files are counted in a process pool instead.
+        total = os.path.getsize(filename)
+        if workers > 1 and total > chunk_size:
+            return self._train_parallel(filename, workers, chunk_size, progress)
+        prev = None
+        with open(filename, 'rb') as f:
+            for tokens, done in _token_batches(f, 0, total, chunk_size, self.tokenizer):
+                prev = self._train_tokens(tokens, prev)
+                if progress:
+                    progress(done, total)
+
+    def _train_parallel(self, filename, workers, chunk_size, progress):
+        # count shards in parallel, then merge; same counts as a serial run
+        total = os.path.getsize(filename)
+        ranges = _shard_ranges(filename, workers)
+        edges = [None] * len(ranges)
+        touched = set()
+        done = 0
+        # spawn, not fork: training runs on a thread of a Qt process, and a forked
+        # child would inherit its locks and threads half-way through
+        ctx = multiprocessing.get_context('spawn')
+        stop = ctx.Event()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_shard_worker, initargs=(stop,)) as pool:
+            futures = {pool.submit(_count_shard, filename, a, b, chunk_size, self.tokenizer): i
+                       for i, (a, b) in enumerate(ranges)}
+            pending = set(futures)
+            try:
+                while pending:
+                    finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        i = futures[fut]
+                        unigrams, bigrams, first, last = fut.result()
+                        edges[i] = (first, last)
+                        self._merge_counts(unigrams, bigrams)
+                        touched.update(unigrams)
+                        done += ranges[i][1] - ranges[i][0]
+                    # also reported while shards are still running, so a cancel is seen
+                    if progress:
+                        progress(done, total)
+            except BaseException:
+                # progress() may raise to cancel: running shards stop at their next
+                # chunk and the ones still queued never start
+                stop.set()
+                pool.shutdown(cancel_futures=True)
+                raise
+        # bigrams that cross shard boundaries
+        cross = defaultdict(Counter)
+        prev = None
+        for first, last in edges:
+            if first is None:
+                continue
+            if prev is not None:
+                cross[prev][first] += 1
+            prev = last
+        self._merge_counts(Counter(), cross)
+        self.index.update(touched)
+        self.version += 1
+
+    def _merge_counts(self, unigrams, bigrams):
+        self.unigrams.update(unigrams)
+        self.total_unigrams += sum(unigrams.values())
+        self.vocab.update(unigrams)
+        for prev, row in bigrams.items():
+            self.bigrams[prev].update(row)
+            self.bigram_totals[prev] += sum(row.values())
+        self.version += 1
+
+    def bigram_row(self, word):
+        # next word -> count for one context word, or None
+        return self.bigrams.get(word)
 
     def _prefix_candidates(self, prefix, max_candidates=200):
-        prefix = prefix.lower()
-        results = [w for w in self.vocab if w.startswith(prefix)]
-        results.sort(key=lambda w: -self.unigrams[w])
-        return results[:max_candidates]
+        # capped at the index's top_n
+        return self.index.complete(normalize(prefix), max_candidates)
+
+    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        # context (earlier words, oldest first) is only used by higher-order engines
+        return [w for _, w in self.predict_scored(prefix, prev_word, k, lambda_context, context)]
 
-    def predict(self, prefix, prev_word=None, k=6, lambda_context=0.6):
-        prefix = prefix.lower()
+    def predict_scored(self, prefix, prev_word=None, k=6, lambda_context=0.6, context=None):
+        # predict() as (score, word) pairs, best first
+        prefix = normalize(prefix)
         if prefix == "": return []
         candidates = self._prefix_candidates(prefix)
-        scored = []
-        for w in candidates:
-            uni_score = self.unigrams[w] / (self.total_unigrams + 1)
-            bi_score = 0.0
-            if prev_word and prev_word.lower() in self.bigrams:
-                bi_count = self.bigrams[prev_word.lower()].get(w, 0)
-                total_bi = sum(self.bigrams[prev_word.lower()].values()) + 1
-                bi_score = bi_count / total_bi
-            score = (1 - lambda_context) * uni_score + lambda_context * bi_score
+        prev = normalize(prev_word) if prev_word else None
+        row = self.bigrams.get(prev) if prev else None
+        return top_k(candidates, self.unigrams.__getitem__, self.total_unigrams,
+                     row, self.bigram_totals[prev] if row else 0, k, lambda_context)
+
+def top_k(candidates, unigram, total_unigrams, row, row_total, k, lambda_context):
+    # candidates: keys sorted by (-unigram count, key); row: the bigram row of the
+    # previous word as a mapping (len/get/items) or None. Keys sort like words.
+    # Returns the best k (score, key) pairs.
+    total_uni = total_unigrams + 1
+    # candidates that also follow the previous word; walk whichever side is smaller
+    boosted = {}
+    if row:
+        if len(row) < len(candidates):
+            cand = set(candidates)
+            for w, c in row.items():
+                if w in cand:
+                    boosted[w] = c
+        else:
+            for w in candidates:
+                c = row.get(w)
+                if c:
+                    boosted[w] = c
+    scored = []
+    if boosted:
+        total_bi = row_total + 1
+        for w, c in boosted.items():
+            score = (1 - lambda_context) * (unigram(w) / total_uni) + lambda_context * (c / total_bi)
             scored.append((score, w))
-        scored.sort(reverse=True)
-        return [w for _, w in scored[:k]]
+    # the rest score on unigrams alone and candidates are already sorted by
+    # count, so only the first k of them (plus ties with the k-th) can win
+    last = None
+    taken = 0
+    for w in candidates:
+        if w in boosted:
+            continue
+        score = (1 - lambda_context) * (unigram(w) / total_uni)
+        if taken >= k and score != last:
+            break
+        scored.append((score, w))
+        last = score
+        taken += 1
+    return heapq.nlargest(k, scored)
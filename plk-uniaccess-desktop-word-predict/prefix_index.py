@@ -0,0 +1,105 @@
+# Prefix trie over the vocabulary. Every node keeps its top-N completions ordered
+# by count, so a lookup only walks the prefix and slices the precomputed list.
+
+class _Node:
+    __slots__ = ('children', 'top', 'floor')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # words in this subtree, highest count first, ties by word (at most top_n)
+        self.floor = 0  # count of the last entry once top is full, else 0
+
+class PrefixTrie:
+    def __init__(self, counts, top_n=200):
+        self.counts = counts  # word -> count mapping owned by the model
+        self.top_n = top_n
+        self.root = _Node()
+
+    def update(self, words):
+        # call after the counts of `words` have grown. Counts never shrink, so a
+        # node's new top list is the best of its old list plus the touched words
+        # below it, and a word under the node's floor can neither be in the list
+        # nor enter it.
+        counts = self.counts
+        touched = {}  # node -> touched words that may belong in its list
+        for w in words:
+            c = counts[w]
+            node = self.root
+            path = [node]
+            for ch in w:
+                nxt = node.children.get(ch)
+                if nxt is None:
+                    nxt = node.children[ch] = _Node()
+                node = nxt
+                path.append(node)
+            for node in path:
+                if c >= node.floor:
+                    ws = touched.get(node)
+                    if ws is None:
+                        touched[node] = [w]
+                    else:
+                        ws.append(w)
+        key = lambda w: (-counts[w], w)
+        n = self.top_n
+        for node, ws in touched.items():
+            if node.top:
+                ws = set(ws)
+                ws.update(node.top)
+            top = node.top = sorted(ws, key=key)[:n]
+            node.floor = counts[top[-1]] if len(top) == n else 0
+
+    def bump(self, word):
+        # cheaper update() for a single word: only its entry can be out of place,
+        # so move it up within (or into) each list on its path
+        counts = self.counts
+        c = counts[word]
+        key = (-c, word)
+        n = self.top_n
+        node = self.root
+        for i in range(len(word) + 1):
+            if i:
+                nxt = node.children.get(word[i - 1])
+                if nxt is None:
+                    nxt = node.children[word[i - 1]] = _Node()
+                node = nxt
+            if c < node.floor:
+                continue
+            top = node.top
+            try:
+                j = top.index(word)
+            except ValueError:
+                if len(top) < n:
+                    top.append(word)
+                elif key < (-counts[top[-1]], top[-1]):
+                    top[-1] = word
+                else:
+                    continue
+                j = len(top) - 1
+            while j > 0 and key < (-counts[top[j - 1]], top[j - 1]):
+                top[j] = top[j - 1]
+                j -= 1
+            top[j] = word
+            if len(top) == n:
+                node.floor = counts[top[-1]]
+
+    def rescale(self, factor):
+        # the owner multiplied every count by factor; keep the floors in step
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            node.floor *= factor
+            stack.extend(node.children.values())
+
+    def find(self, prefix):
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, k=None):
+        node = self.find(prefix)
+        if node is None:
+            return []
+        return node.top[:k] if k is not None else list(node.top)
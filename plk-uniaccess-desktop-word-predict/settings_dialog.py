@@ -46,11 +46,13 @@ class SettingsDialog(QtWidgets.QDialog):
         self.corpus_path.setText(s.get('corpus', ''))
 
     def save_and_close(self):
-        s = {
+        # keep keys this dialog doesn't edit (e.g. model_path)
+        s = dict(self.config.load())
+        s.update({
             'num_suggestions': self.suggestions_spin.value(),
             'min_prefix': self.prefix_spin.value(),
             'bigram_weight': self.bigram_slider.value()/100.0,
             'corpus': self.corpus_path.text()
-        }
+        })
         self.config.save(s)
         self.accept()
@@ -0,0 +1,95 @@
+# Unicode-aware tokenizer shared by training and queries.
+#
+# A word is a run of letters and combining marks (plus the apostrophe, and the
+# zero-width joiners used inside Indic conjuncts), so Devanagari vowel signs and
+# viramas stay inside their word and accented Latin is kept. Text is NFC
+# normalized and lowercased before matching, so queries and training agree on
+# one spelling.
+#
+# Speed: Python's re has no \p{L}/\p{M}, so a character class of letters and
+# marks is built from unicodedata once at import. Classes within the BMP compile
+# to a bitmap and match fast; the few texts with astral characters (emoji, rare
+# scripts) use a slower pattern that also covers those. Pure ASCII text (most
+# English corpora) skips normalization and uses a plain [a-zA-Z'] pattern.
+import re, unicodedata
+
+_JOINERS = '\u200c\u200d'  # ZWNJ, ZWJ
+_VIRAMA = 9  # canonical combining class of viramas
+
+def _ranges(lo, hi, want):
+    # character class body for code points in [lo, hi) whose category passes want;
+    # unassigned code points never occur in text, so they may join two ranges
+    ranges = []
+    start = last = None
+    for c in range(lo, hi):
+        cat = unicodedata.category(chr(c))
+        if cat == 'Cn':
+            continue
+        if want(chr(c), cat):
+            if start is None:
+                start = c
+            last = c
+        elif start is not None:
+            ranges.append((start, last))
+            start = None
+    if start is not None:
+        ranges.append((start, last))
+    return ''.join(re.escape(chr(a)) if a == b else '%s-%s' % (re.escape(chr(a)), re.escape(chr(b)))
+                   for a, b in ranges)
+
+# letters and combining marks in the BMP
+_BMP = _ranges(0, 0x10000, lambda ch, cat: cat[0] in 'LM')
+# astral combining marks (\w already covers astral letters) and variation selectors
+_ASTRAL_MARKS = _ranges(0x10000, 0x20000, lambda ch, cat: cat[0] == 'M' and not ch.isalnum()) + \
+    '\U000e0100-\U000e01ef'
+
+class Tokenizer:
+    def __init__(self, apostrophes="'"):
+        extra = _JOINERS + re.escape(apostrophes)
+        self.ascii_re = re.compile('[a-zA-Z%s]+' % re.escape(apostrophes))
+        self.bmp_re = re.compile('[%s%s]+' % (_BMP, extra))
+        # astral letters come from \w; the lookahead keeps \w from adding BMP digits-like symbols
+        word = '[%s%s]|(?=[^\\x00-\\uffff])[^\\W\\d_]|[%s]' % (_BMP, extra, _ASTRAL_MARKS)
+        self.word_re = re.compile('(?:%s)+' % word)
+        self.char_re = re.compile(word)
+
+    def tokenize(self, text):
+        if text.isascii():
+            return self.ascii_re.findall(text.lower())
+        text = unicodedata.normalize('NFC', text).lower()
+        if max(text) <= '\uffff':
+            return self.bmp_re.findall(text)
+        return self.word_re.findall(text)
+
+    def split_tail(self, text):
+        # split off a trailing token that may continue in the next chunk
+        i = len(text)
+        while i and self.char_re.match(text, i - 1):
+            i -= 1
+        return text[:i], text[i:]
+
+def normalize(text):
+    # query-side spelling of a word or prefix, matching what tokenize() produces
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize('NFC', text).lower()
+
+def graphemes(text):
+    # split into user-perceived characters: a base plus its combining marks and
+    # joiners, with a virama binding the next letter into the same conjunct
+    out = []
+    for ch in text:
+        if out and (unicodedata.category(ch)[0] == 'M' or ch in _JOINERS or out[-1][-1] in _JOINERS
+                    or (unicodedata.combining(out[-1][-1]) == _VIRAMA and ch.isalpha())):
+            out[-1] += ch
+        else:
+            out.append(ch)
+    return out
+
+def grapheme_len(text):
+    if text.isascii():
+        return len(text)
+    return len(graphemes(text))
+
+DEFAULT = Tokenizer()
+tokenize = DEFAULT.tokenize
@@ -0,0 +1,154 @@
+# One long-lived prediction thread between the keyboard hook and the GUI.
+#
+# The hook only records the newest typing context and wakes the worker, so a burst
+# of keys (fast typing, auto-repeat) costs one prediction for the final state,
+# not one per key. Results computed for a context that has since changed are
+# dropped, and fresh ones reach the GUI thread through a Qt signal, so widgets
+# are only touched from the thread that owns them.
+#
+# ModelBuilder trains a replacement model from a corpus the same way, off the
+# GUI thread, while the current model keeps answering.
+import threading, time
+from collections import deque
+from PyQt5 import QtCore
+
+class LatencyStats:
+    # key press -> popup shown, over the most recent samples
+    def __init__(self, keep=1000):
+        self.samples = deque(maxlen=keep)
+        self.shown = 0
+        self.coalesced = 0  # key presses folded into a later one
+        self.stale = 0  # results dropped because newer keys arrived
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.shown += 1
+
+    def percentile(self, q):
+        s = sorted(self.samples)
+        return s[min(int(len(s) * q), len(s) - 1)] if s else 0.0
+
+    def summary(self):
+        return ('popup latency p50 %.1f ms, p99 %.1f ms over %d; %d coalesced, %d stale'
+                % (self.percentile(0.5) * 1e3, self.percentile(0.99) * 1e3,
+                   len(self.samples), self.coalesced, self.stale))
+
+class PredictionWorker(QtCore.QObject):
+    # compute(context) runs on the worker thread; its result is emitted as
+    # ready(result, seq, pressed_at) unless a newer context arrived meanwhile
+    ready = QtCore.pyqtSignal(object, int, float)
+
+    def __init__(self, compute, parent=None):
+        super().__init__(parent)
+        self.compute = compute
+        self.stats = LatencyStats()
+        self._cond = threading.Condition()
+        self._pending = None  # (context, seq, pressed_at) of the newest key press
+        self._seq = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def submit(self, context):
+        # called from the keyboard hook; never blocks on prediction
+        with self._cond:
+            if self._pending is not None:
+                self.stats.coalesced += 1
+            self._seq += 1
+            self._pending = (context, self._seq, time.perf_counter())
+            self._cond.notify()
+
+    def is_current(self, seq):
+        return seq == self._seq
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                context, seq, pressed_at = self._pending
+                self._pending = None
+            try:
+                result = self.compute(context)
+            except Exception as e:
+                print('Failed to predict:', e)
+                continue
+            if self.is_current(seq):
+                self.ready.emit(result, seq, pressed_at)
+            else:
+                self.stats.stale += 1
+
+class BuildCancelled(Exception):
+    pass
+
+class ModelBuilder(QtCore.QObject):
+    # trains make_model() from a corpus on its own thread and saves it to path;
+    # the finished model is emitted as built(model), never touched before that
+    progress = QtCore.pyqtSignal(int)  # percent of the corpus read
+    built = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    save_failed = QtCore.pyqtSignal(str)  # trained, but not saved for the next launch
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, make_model, corpus, path=None, workers=1, parent=None):
+        super().__init__(parent)
+        self.make_model = make_model
+        self.corpus = corpus
+        self.path = path
+        self.saved = False  # the model was written to path
+        self.workers = workers
+        self._cancel = threading.Event()
+        self._percent = -1
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        # takes effect at the next progress report (a chunk, or within 0.2 s when parallel)
+        self._cancel.set()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def _progress(self, done, total):
+        if self._cancel.is_set():
+            raise BuildCancelled()
+        percent = done * 100 // max(total, 1)
+        if percent != self._percent:
+            self._percent = percent
+            self.progress.emit(percent)
+
+    def _run(self):
+        from model_file import save_model
+        try:
+            model = self.make_model()
+            model.train_from_file(self.corpus, progress=self._progress, workers=self.workers)
+            model.predict('a', 'the')  # finish deferred merges here, not on a key press
+            if self._cancel.is_set():
+                raise BuildCancelled()
+            if self.path:
+                try:
+                    save_model(model, self.path)
+                    self.saved = True
+                except (OSError, ValueError) as e:
+                    print('Failed to save model:', e)
+                    self.save_failed.emit(str(e))
+        except BuildCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            print('Failed to train model:', e)
+            self.failed.emit(str(e))
+            return
+        self.built.emit(model)